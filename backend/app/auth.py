@@ -1,18 +1,103 @@
 # app/auth.py
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from opentelemetry import trace
+from sqlalchemy import event
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
 from . import models, database
+from preprocessing.metrics import counter
 
 # Secret key generation: openssl rand -hex 32
 SECRET_KEY = "your_very_secret_key_here"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Authenticated users are cached so most requests skip the users lookup.
+# Entries are dropped early only when this process changes the user through
+# the ORM (see _invalidate_user); a change made by another worker, another
+# host or a raw SQL statement is seen once the entry expires. The TTL is
+# therefore how long a deleted or renamed account can keep authenticating.
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+class Principal:
+    """The authenticated user, detached from any DB session."""
+
+    __slots__ = ("id", "email", "full_name")
+
+    def __init__(self, id, email, full_name):
+        self.id = id
+        self.email = email
+        self.full_name = full_name
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.email, user.full_name)
+
+    def __repr__(self):
+        return f"<User id={self.id} full_name='{self.full_name}' email='{self.email}'>"
+
+
+class PrincipalCache:
+    """TTL + LRU cache of principals keyed by token subject (the email)."""
+
+    def __init__(self, maxsize=AUTH_CACHE_SIZE, ttl_seconds=AUTH_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = counter("auth_cache_hits", "Requests authenticated from cache")
+        self.misses = counter("auth_cache_misses", "Requests that looked up the user")
+
+    def get(self, subject):
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(subject, None)
+                self.misses.inc()
+                return None
+            self._entries.move_to_end(subject)
+            self.hits.inc()
+            return entry[1]
+
+    def put(self, subject, principal):
+        with self._lock:
+            self._entries[subject] = (time.monotonic() + self.ttl_seconds, principal)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, subject=None):
+        with self._lock:
+            if subject is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(subject, None)
+
+
+principal_cache = PrincipalCache()
+
+
+# Any ORM change to a user row (email, password, deletion) in this process
+# drops their entry; other writers are covered only by AUTH_CACHE_TTL_SECONDS
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_user(mapper, connection, user):
+    principal_cache.invalidate(user.email)
+    # A changed email is still cached under the old one
+    for email in get_history(user, "email").deleted:
+        principal_cache.invalidate(email)
+
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -25,7 +110,8 @@ def verify_token(token: str, credentials_exception):
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        return email
+        # Older tokens carry only the subject
+        return email, payload.get("user_id")
     except JWTError:
         raise credentials_exception
 
@@ -35,8 +121,16 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    email = verify_token(token, credentials_exception)
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user is None:
+    email, user_id = verify_token(token, credentials_exception)
+    principal = principal_cache.get(email)
+    if principal is None or (user_id is not None and principal.id != user_id):
+        user = db.query(models.User).filter(models.User.email == email).first()
+        if user is None:
+            raise credentials_exception
+        principal = Principal.from_user(user)
+        principal_cache.put(email, principal)
+    # The account this token was issued to is gone, even if the email was reused
+    if user_id is not None and principal.id != user_id:
         raise credentials_exception
-    return user
+    trace.get_current_span().set_attribute("enduser.id", principal.id)
+    return principal
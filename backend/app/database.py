@@ -1,11 +1,17 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
 
 import os
+import time
 from dotenv import load_dotenv
 from pathlib import Path
 
+from preprocessing.metrics import counter, gauge, histogram
+from preprocessing.tracing import record_stage, stage
+
 # Get path to agents/.env
 env_path = Path(__file__).resolve().parents[1] / ".env"
 # Load local agents/.env
@@ -14,14 +20,143 @@ load_dotenv(dotenv_path=env_path)
 
 SQLALCHEMY_DATABSAE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABSAE_URL)
+# Pool settings (QueuePool; in-memory SQLite uses a single shared connection)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Server-side statement timeout in ms, Postgres only (0 disables)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# Set to 1 to also create an async engine (psycopg async / aiosqlite)
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+psycopg", "sqlite": "sqlite+aiosqlite"}
+
+pool_wait_hist = histogram(
+    "db_pool_checkout_seconds", description="Time to get a pooled connection"
+)
+pool_waits = counter("db_pool_waits", "Checkouts that found the pool exhausted")
+pool_timeouts = counter("db_pool_timeouts", "Checkouts that hit DB_POOL_TIMEOUT")
+
+
+class MeteredPoolMixin:
+    """Times every checkout and counts the ones that had to wait or gave up."""
+
+    def _do_get(self):
+        # max_overflow of -1 means unbounded, so checkouts never wait
+        limit = self.size() + self._max_overflow
+        if self._max_overflow > -1 and self.checkedout() >= limit:
+            pool_waits.inc()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_timeouts.inc()
+            raise
+        finally:
+            pool_wait_hist.observe(time.perf_counter() - start)
+
+
+class MeteredQueuePool(MeteredPoolMixin, QueuePool):
+    pass
+
+
+def engine_options(url, pool_class):
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        # Pooled connections are handed between request threads
+        options = {"connect_args": {"check_same_thread": False}}
+        if url.database in (None, "", ":memory:"):
+            # Each connection would be its own empty database: share one
+            options["poolclass"] = StaticPool
+            return options
+    else:
+        options = {}
+        if DB_STATEMENT_TIMEOUT_MS:
+            timeout = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+            options["connect_args"] = {"options": timeout}
+    options.update(
+        poolclass=pool_class,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return options
+
+
+def async_url(url):
+    """The async-driver form of a sync DATABASE_URL."""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+
+def register_pool_metrics(prefix, pool):
+    if not hasattr(pool, "checkedout"):
+        return
+    gauge(f"{prefix}_checked_out", pool.checkedout, "Connections in use")
+    gauge(f"{prefix}_overflow", pool.overflow, "Connections beyond pool_size")
+    gauge(f"{prefix}_size", pool.size, "Configured pool size")
+
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def time_queries(engine):
+    """Time every statement on `engine` as the db_query stage."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_query(conn, cursor, statement, parameters, context, executemany):
+        record_stage("db_query", time.perf_counter() - conn.info.pop("query_start"))
+
+
+class TimedSession(Session):
+    """A Session whose commits (flush included) are the db_commit stage."""
+
+    def commit(self):
+        with stage("db_commit"):
+            super().commit()
+
+
+engine = create_engine(
+    SQLALCHEMY_DATABSAE_URL,
+    **engine_options(SQLALCHEMY_DATABSAE_URL, MeteredQueuePool),
+)
+register_pool_metrics("db_pool", engine.pool)
+time_queries(engine)
+
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine, class_=TimedSession
+)
 
 Base = declarative_base()
 
 print("Using DB URL:", os.getenv("DATABASE_URL"))
 
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    class MeteredAsyncQueuePool(MeteredPoolMixin, AsyncAdaptedQueuePool):
+        pass
+
+    url = ASYNC_DATABASE_URL or async_url(SQLALCHEMY_DATABSAE_URL)
+    async_engine = create_async_engine(
+        url, **engine_options(url, MeteredAsyncQueuePool)
+    )
+    register_pool_metrics("db_async_pool", async_engine.pool)
+    time_queries(async_engine.sync_engine)
+    # Same commit timing as SessionLocal: AsyncSession runs a TimedSession
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, expire_on_commit=False, sync_session_class=TimedSession
+    )
+
 
 # Dependency
 def get_db():
@@ -30,3 +165,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
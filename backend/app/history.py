@@ -0,0 +1,157 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+from sqlalchemy import DateTime, String, and_, literal, null, or_, select, union_all
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from . import models
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "200"))
+
+# (model, disease_type, result column, timestamp column, image column)
+HISTORY_SOURCES = [
+    (
+        models.KidneyScan,
+        "kidney_disease",
+        models.KidneyScan.result,
+        models.KidneyScan.created_at,
+        None,
+    ),
+    (
+        models.HeartScan,
+        "heart_disease",
+        models.HeartScan.result,
+        models.HeartScan.created_at,
+        None,
+    ),
+    (
+        models.BrainScan,
+        "brain_tumor",
+        models.BrainScan.tumor_type,
+        models.BrainScan.uploaded_at,
+        models.BrainScan.file_path,
+    ),
+    (
+        models.MRIScan,
+        "alzheimer",
+        models.MRIScan.prediction,
+        models.MRIScan.uploaded_at,
+        models.MRIScan.file_path,
+    ),
+]
+
+
+class sort_time(FunctionElement):
+    """
+    A timestamp as pages are ordered and compared. On SQLite it's julianday():
+    func.now() stores whole seconds ("... 12:00:00") but bound datetimes are
+    rendered with microseconds ("... 12:00:00.000000"), so comparing the text
+    would put the cursor row before itself. Elsewhere the column is used as is.
+    """
+
+    type = DateTime()
+    name = "sort_time"
+    inherit_cache = True
+
+
+@compiles(sort_time)
+def _sort_time(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+
+@compiles(sort_time, "sqlite")
+def _sort_time_sqlite(element, compiler, **kw):
+    return f"julianday({compiler.process(element.clauses, **kw)})"
+
+
+def encode_cursor(row):
+    data = [row.created_at.isoformat(), row.disease_type, row.id]
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Raises ValueError for anything that isn't a cursor we issued."""
+    try:
+        created_at, disease_type, scan_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(created_at), str(disease_type), int(scan_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _after(disease_type, created, scan_id, cursor):
+    """Rows of one table that sort after the cursor.
+
+    Pages are ordered by (created_at, disease_type, id) descending; ids repeat
+    across tables, so disease_type breaks ties between them. It's constant
+    within a table, which keeps the condition a plain range on the
+    (user_id, created_at) index (except on SQLite, see sort_time).
+    """
+    cursor_created, cursor_disease, cursor_id = cursor
+    created, cursor_created = sort_time(created), sort_time(cursor_created)
+    if disease_type < cursor_disease:
+        return created <= cursor_created
+    if disease_type > cursor_disease:
+        return created < cursor_created
+    return or_(
+        created < cursor_created,
+        and_(created == cursor_created, scan_id < cursor_id),
+    )
+
+
+def history_query(user_id, limit, cursor=None):
+    branches = []
+    for model, disease_type, result, created, image in HISTORY_SOURCES:
+        branch = select(
+            model.id.label("id"),
+            literal(disease_type, String).label("disease_type"),
+            result.label("result"),
+            model.confidence.label("confidence_score"),
+            created.label("created_at"),
+            (image if image is not None else null()).label("image_url"),
+        ).where(model.user_id == user_id)
+        if cursor is not None:
+            branch = branch.where(_after(disease_type, created, model.id, cursor))
+        branches.append(branch)
+
+    history = union_all(*branches).subquery()
+    return (
+        select(history)
+        .order_by(
+            sort_time(history.c.created_at).desc(),
+            history.c.disease_type.desc(),
+            history.c.id.desc(),
+        )
+        .limit(limit)
+    )
+
+
+def _page(rows, limit):
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    items = [
+        {
+            "id": row.id,
+            "disease_type": row.disease_type,
+            "prediction_result": {"result": row.result},
+            "confidence_score": row.confidence_score,
+            "created_at": row.created_at,
+            "image_url": row.image_url,
+        }
+        for row in rows[:limit]
+    ]
+    return items, next_cursor
+
+
+def history_page(db, user_id, limit=HISTORY_PAGE_SIZE, cursor=None):
+    """One page of a user's predictions, newest first, and the next cursor."""
+    rows = db.execute(history_query(user_id, limit + 1, cursor)).all()
+    return _page(rows, limit)
+
+
+async def history_page_async(db, user_id, limit=HISTORY_PAGE_SIZE, cursor=None):
+    """history_page for an AsyncSession."""
+    rows = (await db.execute(history_query(user_id, limit + 1, cursor))).all()
+    return _page(rows, limit)
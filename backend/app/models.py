@@ -1,4 +1,15 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, ForeignKey
+from sqlalchemy import (
+    JSON,
+    Column,
+    Integer,
+    String,
+    Boolean,
+    Float,
+    DateTime,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+)
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -33,10 +44,16 @@ class User(Base):
 
 class MRIScan(Base):
     __tablename__ = "mri_scans"
+    __table_args__ = (
+        Index("ix_mri_scans_user_id_uploaded_at", "user_id", "uploaded_at"),
+        # A user's re-upload of the same image returns the existing scan
+        UniqueConstraint("user_id", "content_hash"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String, unique=True, index=True)
+    filename = Column(String)
     file_path = Column(String)
+    content_hash = Column(String(64), index=True)
     prediction = Column(String)
     confidence = Column(Float)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -47,10 +64,15 @@ class MRIScan(Base):
 
 class BrainScan(Base):
     __tablename__ = "brain_scans"
+    __table_args__ = (
+        Index("ix_brain_scans_user_id_uploaded_at", "user_id", "uploaded_at"),
+        UniqueConstraint("user_id", "content_hash"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String, unique=True, index=True)
+    filename = Column(String)
     file_path = Column(String)
+    content_hash = Column(String(64), index=True)
     tumor_type = Column(String)
     confidence = Column(Float)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -61,6 +83,9 @@ class BrainScan(Base):
 
 class HeartScan(Base):
     __tablename__ = "heart_scans"
+    __table_args__ = (
+        Index("ix_heart_scans_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     age = Column(Integer, nullable=False)
@@ -86,6 +111,9 @@ class HeartScan(Base):
 
 class KidneyScan(Base):
     __tablename__ = "kidney_scans"
+    __table_args__ = (
+        Index("ix_kidney_scans_user_id_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     age = Column(Integer, nullable=False)
@@ -118,3 +146,16 @@ class KidneyScan(Base):
 
     user_id = Column(Integer, ForeignKey("users.id"))
     user = relationship("User", back_populates="kidney_scans")
+
+
+class PredictionCacheEntry(Base):
+    __tablename__ = "prediction_cache"
+    __table_args__ = (UniqueConstraint("disease", "content_hash", "model_version"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    disease = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=False, index=True)
+    model_version = Column(String, nullable=False)
+    class_id = Column(Integer, nullable=False)
+    probabilities = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
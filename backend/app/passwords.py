@@ -0,0 +1,92 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from preprocessing.metrics import LATENCY_BUCKETS, counter, histogram
+
+# bcrypt releases the GIL, so a few threads use that many cores
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1)))
+)
+# Hash requests allowed in flight (running + queued) before returning 429
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "16"))
+
+HASH_BUCKETS = LATENCY_BUCKETS + (5.0, 10.0)
+
+
+class HashPoolBusy(RuntimeError):
+    pass
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on its own small thread pool.
+
+    Admission is non-blocking: once `max_pending` calls are running or
+    queued, further calls raise HashPoolBusy straight away. The async
+    methods wait on the event loop, so auth routes hold neither a request
+    thread nor a DB connection while bcrypt runs.
+    """
+
+    def __init__(
+        self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING
+    ):
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.queue_hist = histogram(
+            "password_hash_queue_seconds",
+            HASH_BUCKETS,
+            "Time waiting for a hash worker",
+        )
+        self.hash_hist = histogram(
+            "password_hash_seconds", HASH_BUCKETS, "Time spent in bcrypt"
+        )
+        self.rejected = counter(
+            "password_hash_rejected", "Hash requests refused with the pool full"
+        )
+
+    def _submit(self, fn, *args):
+        """A concurrent.futures.Future of fn(*args); its slot frees when done."""
+        if not self._slots.acquire(blocking=False):
+            self.rejected.inc()
+            raise HashPoolBusy("Too many concurrent password checks")
+        submitted = time.perf_counter()
+
+        def timed():
+            start = time.perf_counter()
+            self.queue_hist.observe(start - submitted)
+            try:
+                return fn(*args)
+            finally:
+                self.hash_hist.observe(time.perf_counter() - start)
+
+        try:
+            future = self._executor.submit(timed)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def hash(self, password):
+        return self._submit(self.context.hash, password).result()
+
+    def verify(self, password, hashed_password):
+        return self._submit(self.context.verify, password, hashed_password).result()
+
+    async def hash_async(self, password):
+        return await asyncio.wrap_future(self._submit(self.context.hash, password))
+
+    async def verify_async(self, password, hashed_password):
+        future = self._submit(self.context.verify, password, hashed_password)
+        return await asyncio.wrap_future(future)
+
+
+password_hasher = PasswordHasher()
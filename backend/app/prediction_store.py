@@ -0,0 +1,44 @@
+from sqlalchemy.exc import IntegrityError
+
+from . import models
+from .database import SessionLocal
+
+
+class DatabasePredictionStore:
+    """Persistent tier of the prediction cache, backed by `prediction_cache`."""
+
+    def load(self, disease, digest, model_version):
+        with SessionLocal() as db:
+            entry = (
+                db.query(models.PredictionCacheEntry)
+                .filter(
+                    models.PredictionCacheEntry.disease == disease,
+                    models.PredictionCacheEntry.content_hash == digest,
+                    models.PredictionCacheEntry.model_version == model_version,
+                )
+                .first()
+            )
+            if entry is None:
+                return None
+            return {
+                "class_id": entry.class_id,
+                "probabilities": entry.probabilities,
+                "model_version": entry.model_version,
+            }
+
+    def save(self, disease, digest, model_version, result):
+        with SessionLocal() as db:
+            db.add(
+                models.PredictionCacheEntry(
+                    disease=disease,
+                    content_hash=digest,
+                    model_version=model_version,
+                    class_id=result["class_id"],
+                    probabilities=result["probabilities"],
+                )
+            )
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker cached the same image first
+                db.rollback()
@@ -7,6 +7,7 @@ from fastapi import (
     APIRouter,
     File,
     UploadFile,
+    Query,
 )
 from fastapi.params import Body
 from random import randrange
@@ -17,31 +18,67 @@ import time
 from . import models, schemas
 from app.models import HeartScan, KidneyScan, BrainScan, MRIScan, User
 
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from .database import engine, SessionLocal, get_db
-from passlib.context import CryptContext
+from .database import engine, SessionLocal, AsyncSessionLocal, get_db
+from pydantic import ValidationError
+import csv
+import io
 import os
-import shutil
-import random
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from .auth import create_access_token
+from .passwords import HashPoolBusy, password_hasher
+from .history import (
+    HISTORY_MAX_PAGE_SIZE,
+    HISTORY_PAGE_SIZE,
+    decode_cursor,
+    history_page,
+    history_page_async,
+)
+from .prediction_store import DatabasePredictionStore
+from preprocessing import heart as heart_model, kidney as kidney_model, metrics
+from preprocessing.inference import model_name, probability_predictor
+from preprocessing.labels import ALZHAIMER_LABELS, BRAIN_LABELS
+from preprocessing.cache import prediction_cache
+from preprocessing.tracing import TimingMiddleware, configure_tracing
+from preprocessing.uploads import UploadSizeLimitMiddleware, UploadTooLarge, read_upload
 
 
 models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI()
 
+# Added before CORS so the 413 still carries CORS headers
+app.add_middleware(UploadSizeLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # or specify: ["http://localhost:5173"]
     allow_credentials=True,
     allow_methods=["*"],  # allow all HTTP methods (GET, POST, OPTIONS, etc.)
     allow_headers=["*"],  # allow all headers (e.g., Content-Type, Authorization)
+    expose_headers=["X-Next-Cursor", "Server-Timing"],
 )
+# Outermost, so the request span and Server-Timing total cover everything
+configure_tracing("vivek")
+app.add_middleware(TimingMiddleware)
+
+MRI_UPLOAD_DIR = "uploaded_mri"
+BRAIN_UPLOAD_DIR = "uploaded_brain_mri"
+os.makedirs(MRI_UPLOAD_DIR, exist_ok=True)
+os.makedirs(BRAIN_UPLOAD_DIR, exist_ok=True)
 
-UPLOAD_DIR = "uploaded_mri"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Model outputs are cached by image content hash in the DB plus an in-process LRU
+prediction_cache.store = DatabasePredictionStore()
+
+# Image models on the configured backend (INFERENCE_BACKEND=native|onnx)
+ALZHAIMER_MODEL = model_name("alzhaimer")
+BRAIN_MODEL = model_name("brain")
+predict_alzhaimer = probability_predictor("alzhaimer")
+predict_brain = probability_predictor("brain")
 
 
 # while True:
@@ -79,31 +116,74 @@ async def root():
     return {"message": "Hello World"}
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@app.get("/metrics")
+async def metrics_snapshot():
+    return metrics.snapshot()
+
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def metrics_prometheus():
+    return PlainTextResponse(
+        metrics.prometheus_text(), media_type="text/plain; version=0.0.4"
+    )
+
+
+def too_many_auth_requests():
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many login attempts, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def find_user(email):
+    """The user row for `email`; its DB connection is returned before hashing."""
+    query = select(models.User).where(models.User.email == email)
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(query)
+
+    def sync_find():
+        with SessionLocal() as db:
+            return db.scalar(query)
+
+    return await run_in_threadpool(sync_find)
 
 
 @app.post("/register")
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user:
+async def register(user: schemas.UserCreate):
+    if await find_user(user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = pwd_context.hash(user.password)
+    try:
+        hashed_password = await password_hasher.hash_async(user.password)
+    except HashPoolBusy:
+        raise too_many_auth_requests()
     new_user = models.User(
         email=user.email, full_name=user.full_name, hashed_password=hashed_password
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    try:
+        await save_row(new_user)
+    except IntegrityError:
+        # Registered by a concurrent request while we were hashing
+        raise HTTPException(status_code=400, detail="Email already registered")
     return {"message": "User registered successfully"}
 
 
 @app.post("/login")
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if not db_user or not pwd_context.verify(user.password, db_user.hashed_password):
+async def login(user: schemas.UserLogin):
+    db_user = await find_user(user.email)
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    try:
+        valid = await password_hasher.verify_async(
+            user.password, db_user.hashed_password
+        )
+    except HashPoolBusy:
+        raise too_many_auth_requests()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
-    token = create_access_token(data={"sub": db_user.email})
+    token = create_access_token(data={"sub": db_user.email, "user_id": db_user.id})
     return {
         "message": "Login successful",
         "access_token": token,
@@ -112,237 +192,391 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
     }
 
 
-from .auth import get_current_user
+from .auth import Principal, get_current_user
+
+
+upload_store_errors = metrics.counter(
+    "upload_store_errors", "Uploads whose spool write failed (disk full, I/O error)"
+)
+
+
+def receive_upload(file: UploadFile, spool_dir):
+    """Stream an upload into `spool_dir`, answering 413 once it's too large."""
+    try:
+        return read_upload(file.file, file.size, spool_dir)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except OSError:
+        # A spool write failed; nothing was kept
+        upload_store_errors.inc()
+        raise HTTPException(status_code=507, detail="Could not store the upload")
+
+
+def user_scan(db: Session, model, user_id, digest):
+    return (
+        db.query(model)
+        .filter(model.user_id == user_id, model.content_hash == digest)
+        .first()
+    )
+
+
+def add_scan(db: Session, scan):
+    """
+    Insert `scan`, or return the row a concurrent upload of the same image by
+    the same user inserted first (the (user_id, content_hash) constraint).
+    """
+    db.add(scan)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = user_scan(db, type(scan), scan.user_id, scan.content_hash)
+        if existing is None:
+            raise
+        return existing
+    db.refresh(scan)
+    return scan
+
+
+def mri_response(scan, message):
+    return {
+        "message": message,
+        "id": scan.id,
+        "prediction": scan.prediction,
+        "confidence": scan.confidence,
+    }
+
+
+def brain_response(scan, message):
+    return {
+        "message": message,
+        "id": scan.id,
+        "tumor_type": scan.tumor_type,
+        "confidence": scan.confidence,
+    }
 
 
 @app.post("/upload-mri")
 def upload_mri(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    print(current_user)
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Invalid file type")
 
     filename = file.filename
-    file_path = os.path.join(UPLOAD_DIR, filename)
-
-    # Duplicate check
-    existing = (
-        db.query(models.MRIScan).filter(models.MRIScan.filename == filename).first()
+    upload = receive_upload(file, MRI_UPLOAD_DIR)
+    digest = upload.digest
+
+    # The same image from the same user, whatever it is called, is the scan
+    # already on record
+    existing = user_scan(db, models.MRIScan, current_user.id, digest)
+    if existing is not None:
+        upload.discard()
+        return mri_response(existing, "MRI scan already uploaded")
+
+    # Keep the file on disk under its content hash
+    extension = os.path.splitext(filename)[1]
+    file_path = upload.save(os.path.join(MRI_UPLOAD_DIR, digest + extension))
+
+    result = prediction_cache.get_or_compute(
+        ALZHAIMER_MODEL, upload.data, predict_alzhaimer, digest
     )
-    if existing:
-        raise HTTPException(
-            status_code=400, detail="This MRI scan has already been uploaded"
-        )
-
-    # Save file to disk
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Placeholder prediction
-    prediction = "Mild Dementia"
-    confidence = 92.0
+    class_id = result["class_id"]
+    prediction = ALZHAIMER_LABELS[class_id]
+    confidence = round(result["probabilities"][class_id] * 100, 2)
 
     # Save record to DB
     new_scan = models.MRIScan(
         filename=filename,
         file_path=file_path,
+        content_hash=digest,
         prediction=prediction,
         confidence=confidence,
         user_id=current_user.id,
     )
-    db.add(new_scan)
-    db.commit()
-    db.refresh(new_scan)
-
-    return {
-        "message": "MRI scan uploaded successfully",
-        "id": new_scan.id,
-        "prediction": prediction,
-        "confidence": confidence,
-    }
-
-
-UPLOAD_DIR = "uploaded_brain_mri"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+    scan = add_scan(db, new_scan)
+    if scan is not new_scan:
+        return mri_response(scan, "MRI scan already uploaded")
+    return mri_response(scan, "MRI scan uploaded successfully")
 
 
 @app.post("/upload-brain-mri")
 def upload_brain_mri(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    print(current_user)
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Only image files are allowed")
 
     filename = file.filename
-    file_path = os.path.join(UPLOAD_DIR, filename)
+    upload = receive_upload(file, BRAIN_UPLOAD_DIR)
+    digest = upload.digest
 
-    # Duplicate check
-    if db.query(models.BrainScan).filter(models.BrainScan.filename == filename).first():
-        raise HTTPException(status_code=400, detail="File already uploaded")
+    existing = user_scan(db, models.BrainScan, current_user.id, digest)
+    if existing is not None:
+        upload.discard()
+        return brain_response(existing, "File already uploaded")
 
-    # Save image
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Keep the image under its content hash
+    extension = os.path.splitext(filename)[1]
+    file_path = upload.save(os.path.join(BRAIN_UPLOAD_DIR, digest + extension))
 
-    # Simulate prediction
-    tumor_classes = ["No Tumor", "Glioma", "Meningioma", "Pituitary"]
-    tumor_type = random.choice(tumor_classes)
-    confidence = round(random.uniform(85, 99), 2)
+    result = prediction_cache.get_or_compute(
+        BRAIN_MODEL, upload.data, predict_brain, digest
+    )
+    class_id = result["class_id"]
+    tumor_type = BRAIN_LABELS[class_id]
+    confidence = round(result["probabilities"][class_id] * 100, 2)
 
     # Save to DB
     scan = models.BrainScan(
         filename=filename,
         file_path=file_path,
+        content_hash=digest,
         tumor_type=tumor_type,
         confidence=confidence,
         user_id=current_user.id,
     )
-    db.add(scan)
-    db.commit()
-    db.refresh(scan)
+    saved = add_scan(db, scan)
+    if saved is not scan:
+        return brain_response(saved, "File already uploaded")
+    return brain_response(saved, "Upload successful")
 
-    return {
-        "message": "Upload successful",
-        "id": scan.id,
-        "tumor_type": tumor_type,
-        "confidence": confidence,
-    }
+
+def heart_label(label):
+    return "Positive" if label == 1 else "Negative"
+
+
+def kidney_label(label):
+    return "CKD" if label == 1 else "Not CKD"
+
+
+async def save_row(scan):
+    """Insert one row and return its id (on the async engine if enabled)."""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            db.add(scan)
+            await db.commit()
+            return scan.id
+
+    def sync_save():
+        with SessionLocal() as db:
+            db.add(scan)
+            db.commit()
+            return scan.id
+
+    return await run_in_threadpool(sync_save)
 
 
 @app.post("/predict-heart", response_model=dict)
-def predict_heart(
+async def predict_heart(
     input: schemas.HeartScanInput,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    print(current_user)
     data = input.dict()
-    # Dummy prediction logic (to replace with real ML)
-    result = random.choice(["Positive", "Negative"])
-    confidence = round(random.uniform(75, 95), 2)
+    labels, confidences = await run_in_threadpool(heart_model.predict_batch, [data])
+    result = heart_label(labels[0])
+    confidence = round(float(confidences[0]) * 100, 2)
 
     # Save to database
-    scan = models.HeartScan(
-        **data, result=result, confidence=confidence, user_id=current_user.id
+    scan_id = await save_row(
+        models.HeartScan(
+            **data, result=result, confidence=confidence, user_id=current_user.id
+        )
     )
-    db.add(scan)
-    db.commit()
-    db.refresh(scan)
 
     return {
         "message": "Prediction saved",
-        "id": scan.id,
+        "id": scan_id,
         "result": result,
         "confidence": confidence,
     }
 
 
 @app.post("/predict-kidney")
-def predict_kidney(
+async def predict_kidney(
     input: schemas.KidneyScanInput,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    print(current_user)
     data = input.dict()
-
-    # Simulated prediction (replace with ML model)
-    result = random.choice(["CKD", "Not CKD"])
-    confidence = round(random.uniform(80, 99), 2)
-    scan = models.KidneyScan(
-        **data, result=result, confidence=confidence, user_id=current_user.id
+    labels, confidences = await run_in_threadpool(kidney_model.predict_batch, [data])
+    result = kidney_label(labels[0])
+    confidence = round(float(confidences[0]) * 100, 2)
+    scan_id = await save_row(
+        models.KidneyScan(
+            **data, result=result, confidence=confidence, user_id=current_user.id
+        )
     )
-    db.add(scan)
-    db.commit()
-    db.refresh(scan)
 
     return {
         "message": "Kidney scan prediction saved",
-        "id": scan.id,
+        "id": scan_id,
         "result": result,
         "confidence": confidence,
     }
 
 
-@app.get("/history", response_model=list[schemas.PredictionResult])
-def get_user_predictions(
-    db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)
+# ----------- Bulk scoring -------------
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "10000"))
+
+
+def check_batch_size(rows):
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows to score")
+    if len(rows) > BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {BATCH_MAX_ROWS} rows per batch"
+        )
+
+
+def read_csv_rows(file: UploadFile, schema):
+    """Parse and validate an uploaded CSV into a list of input dicts."""
+    reader = csv.DictReader(io.TextIOWrapper(file.file, encoding="utf-8-sig"))
+    rows, errors = [], []
+    for line, record in enumerate(reader, start=2):
+        try:
+            rows.append(schema(**record).dict())
+        except ValidationError as e:
+            errors.append({"line": line, "errors": e.errors(include_context=False)})
+        if len(rows) + len(errors) > BATCH_MAX_ROWS:
+            break
+    if errors:
+        raise HTTPException(status_code=422, detail=errors[:50])
+    return rows
+
+
+async def insert_scans(model, records):
+    """Bulk-insert rows in one statement and return their ids in order."""
+    statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            ids = (await db.scalars(statement, records)).all()
+            await db.commit()
+            return ids
+
+    def sync_insert():
+        with SessionLocal() as db:
+            ids = db.scalars(statement, records).all()
+            db.commit()
+            return ids
+
+    return await run_in_threadpool(sync_insert)
+
+
+async def score_and_store(rows, predict_batch, model, label_for, user_id):
+    """Score all rows in one model call and bulk-insert them in one statement."""
+    check_batch_size(rows)
+    labels, confidences = await run_in_threadpool(predict_batch, rows)
+    records = [
+        {
+            **row,
+            "result": label_for(label),
+            "confidence": round(float(confidence) * 100, 2),
+            "user_id": user_id,
+        }
+        for row, label, confidence in zip(rows, labels, confidences)
+    ]
+    ids = await insert_scans(model, records)
+    return {
+        "message": "Batch predictions saved",
+        "count": len(records),
+        "results": [
+            {"id": id, "result": r["result"], "confidence": r["confidence"]}
+            for id, r in zip(ids, records)
+        ],
+    }
+
+
+@app.post("/predict-heart/batch")
+async def predict_heart_batch(
+    inputs: list[schemas.HeartScanInput],
+    current_user: Principal = Depends(get_current_user),
 ):
-    user_id = current_user.id
+    rows = [input.dict() for input in inputs]
+    return await score_and_store(
+        rows,
+        heart_model.predict_batch,
+        models.HeartScan,
+        heart_label,
+        current_user.id,
+    )
 
-    history = []
 
-    # Kidney Predictions
-    kidney_scans = (
-        db.query(models.KidneyScan).filter(models.KidneyScan.user_id == user_id).all()
+@app.post("/predict-heart/batch/csv")
+async def predict_heart_batch_csv(
+    file: UploadFile = File(...),
+    current_user: Principal = Depends(get_current_user),
+):
+    rows = await run_in_threadpool(read_csv_rows, file, schemas.HeartScanInput)
+    return await score_and_store(
+        rows,
+        heart_model.predict_batch,
+        models.HeartScan,
+        heart_label,
+        current_user.id,
     )
-    for scan in kidney_scans:
-        history.append(
-            {
-                "id": scan.id,
-                "disease_type": "kidney_disease",
-                "prediction_result": {"result": scan.result},
-                "confidence_score": scan.confidence,
-                "created_at": scan.created_at,
-                "image_url": None,
-            }
-        )
 
-    # Heart Predictions
-    heart_scans = (
-        db.query(models.HeartScan).filter(models.HeartScan.user_id == user_id).all()
+
+@app.post("/predict-kidney/batch")
+async def predict_kidney_batch(
+    inputs: list[schemas.KidneyScanInput],
+    current_user: Principal = Depends(get_current_user),
+):
+    rows = [input.dict() for input in inputs]
+    return await score_and_store(
+        rows,
+        kidney_model.predict_batch,
+        models.KidneyScan,
+        kidney_label,
+        current_user.id,
     )
-    for scan in heart_scans:
-        history.append(
-            {
-                "id": scan.id,
-                "disease_type": "heart_disease",
-                "prediction_result": {"result": scan.result},
-                "confidence_score": scan.confidence,
-                "created_at": scan.created_at,
-                "image_url": None,
-            }
-        )
 
-    # Brain Tumor Predictions
-    brain_scans = (
-        db.query(models.BrainScan).filter(models.BrainScan.user_id == user_id).all()
+
+@app.post("/predict-kidney/batch/csv")
+async def predict_kidney_batch_csv(
+    file: UploadFile = File(...),
+    current_user: Principal = Depends(get_current_user),
+):
+    rows = await run_in_threadpool(read_csv_rows, file, schemas.KidneyScanInput)
+    return await score_and_store(
+        rows,
+        kidney_model.predict_batch,
+        models.KidneyScan,
+        kidney_label,
+        current_user.id,
     )
-    for scan in brain_scans:
-        history.append(
-            {
-                "id": scan.id,
-                "disease_type": "brain_tumor",
-                "prediction_result": {"result": scan.tumor_type},
-                "confidence_score": scan.confidence,
-                "created_at": scan.uploaded_at,
-                "image_url": scan.file_path,
-            }
-        )
 
-    # Alzheimer Predictions
-    mri_scans = db.query(models.MRIScan).filter(models.MRIScan.user_id == user_id).all()
-    for scan in mri_scans:
-        history.append(
-            {
-                "id": scan.id,
-                "disease_type": "alzheimer",
-                "prediction_result": {"result": scan.prediction},
-                "confidence_score": scan.confidence,
-                "created_at": scan.uploaded_at,
-                "image_url": scan.file_path,
-            }
-        )
 
-    # Sort all by date descending
-    history.sort(key=lambda x: x["created_at"], reverse=True)
-    print(history)
+@app.get("/history", response_model=list[schemas.PredictionResult])
+async def get_user_predictions(
+    response: Response,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user),
+):
+    """Newest predictions first; pass X-Next-Cursor back as `cursor` for more."""
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            page = await history_page_async(db, current_user.id, limit, after)
+    else:
+
+        def sync_page():
+            with SessionLocal() as db:
+                return history_page(db, current_user.id, limit, after)
+
+        page = await run_in_threadpool(sync_page)
+
+    history, next_cursor = page
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return history
 
 
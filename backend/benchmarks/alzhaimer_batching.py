@@ -0,0 +1,78 @@
+"""
+Per-request vs micro-batched throughput of the Alzheimer ResNet18.
+
+Run from backend/:
+    python -m benchmarks.alzhaimer_batching --images 256 --batch-size 32
+"""
+
+import argparse
+import asyncio
+import time
+
+import torch
+
+from preprocessing.alzhaimer import DEVICE, get_model, predict_batch
+from preprocessing.batching import MicroBatcher
+
+
+def random_model():
+    # Same architecture with untrained weights; throughput does not depend on them
+    from torchvision import models
+    import torch.nn as nn
+
+    model = models.resnet18(weights=None)
+    model.conv1 = nn.Conv2d(1, 64, kernel_size=7, stride=2, padding=3, bias=False)
+    model.fc = nn.Linear(model.fc.in_features, 4)
+    return model.eval().to(DEVICE)
+
+
+def bench_per_request(model, tensors):
+    start = time.perf_counter()
+    for tensor in tensors:
+        predict_batch([tensor], model)
+    return len(tensors) / (time.perf_counter() - start)
+
+
+async def bench_batched(model, tensors, batch_size, wait_ms):
+    batcher = MicroBatcher(
+        "bench_alzhaimer",
+        lambda batch: predict_batch(batch, model),
+        max_batch_size=batch_size,
+        max_wait_ms=wait_ms,
+    )
+    start = time.perf_counter()
+    await asyncio.gather(*(batcher.submit(tensor) for tensor in tensors))
+    return len(tensors) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--wait-ms", type=float, default=10.0)
+    parser.add_argument(
+        "--random-weights",
+        action="store_true",
+        help="use an untrained ResNet18 when dementia_classifier.pth is absent",
+    )
+    args = parser.parse_args()
+
+    model = random_model() if args.random_weights else get_model()
+    tensors = [torch.rand(1, 1, 128, 128) for _ in range(args.images)]
+
+    # Warm up kernels before timing
+    predict_batch(tensors[: args.batch_size], model)
+
+    per_request = bench_per_request(model, tensors)
+    batched = asyncio.run(
+        bench_batched(model, tensors, args.batch_size, args.wait_ms)
+    )
+
+    print(f"threads:      {torch.get_num_threads()}")
+    print(f"per-request:  {per_request:8.1f} images/sec")
+    print(f"batched ({args.batch_size}): {batched:8.1f} images/sec")
+    print(f"speedup:      {batched / per_request:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
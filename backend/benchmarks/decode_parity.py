@@ -0,0 +1,79 @@
+"""
+Predictions with full-size decoding vs reduced JPEG decoding (DECODE_REDUCED).
+
+Run from backend/:
+    python -m benchmarks.decode_parity brain ../data/braintumor-mri/Testing
+    python -m benchmarks.decode_parity alzhaimer scans/ --backend onnx --limit 500
+
+Every image is scored both ways on the same model. Prints how often the
+predicted class agrees, the largest probability difference, the time per
+image of each decode, and the accuracy of each when images sit in folders
+named after their class.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from preprocessing import decode
+from preprocessing.batch_score import CLASSES, batch_predictor, find_images
+from preprocessing.inference import BACKENDS, backend
+from preprocessing.onnx_backend import preprocess_batch
+
+
+def score(name, predict, datas, reduced, batch_size):
+    """(probabilities, decode seconds) with DECODE_REDUCED set to `reduced`."""
+    decode.DECODE_REDUCED = reduced
+    probs, decode_seconds = [], 0.0
+    for i in range(0, len(datas), batch_size):
+        start = time.perf_counter()
+        batch, errors = preprocess_batch(name, datas[i : i + batch_size])
+        decode_seconds += time.perf_counter() - start
+        if any(errors):
+            raise ValueError(f"images in batch {i // batch_size} failed to decode")
+        probs.append(predict(batch))
+    return np.concatenate(probs), decode_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("model", choices=list(CLASSES))
+    parser.add_argument("root", help="directory tree of images")
+    parser.add_argument("--backend", choices=BACKENDS, help="default: configured")
+    parser.add_argument("--limit", type=int, help="score at most this many images")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    classes = CLASSES[args.model]
+    paths = find_images(args.root)[: args.limit]
+    datas = []
+    for path in paths:
+        with open(os.path.join(args.root, path), "rb") as f:
+            datas.append(f.read())
+    predict = batch_predictor(args.model, args.backend or backend(args.model))
+
+    full, full_seconds = score(args.model, predict, datas, False, args.batch_size)
+    reduced, reduced_seconds = score(args.model, predict, datas, True, args.batch_size)
+
+    agree = full.argmax(axis=1) == reduced.argmax(axis=1)
+    print(f"{len(paths)} images")
+    print(f"same predicted class  {agree.mean():.4%} ({(~agree).sum()} differ)")
+    print(f"max |p_full - p_reduced|  {np.abs(full - reduced).max():.4f}")
+    print(
+        f"decode ms/image  full {full_seconds / len(paths) * 1000:.2f}"
+        f"  reduced {reduced_seconds / len(paths) * 1000:.2f}"
+    )
+
+    labels = [classes.get(os.path.basename(os.path.dirname(path))) for path in paths]
+    labelled = np.array([label is not None for label in labels])
+    if labelled.any():
+        truth = np.array([label for label in labels if label is not None])
+        for mode, probs in (("full", full), ("reduced", reduced)):
+            accuracy = (probs[labelled].argmax(axis=1) == truth).mean()
+            print(f"accuracy {mode:8s} {accuracy:.4f} over {labelled.sum()} images")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Keyset paging of /history over rows that share one timestamp, as bulk
+inserts produce. Every row must come back exactly once; page latency is
+printed per page.
+
+Run from backend/:
+    python -m benchmarks.history_paging --rows 5000 --limit 50
+    python -m benchmarks.history_paging --database-url postgresql://localhost/drml
+
+Exits 1 when a row is repeated or missing.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+
+def heart_row(user_id):
+    return {
+        "age": 54,
+        "sex": 1,
+        "cp": 2,
+        "trestbps": 130,
+        "chol": 246,
+        "fbs": 0,
+        "restecg": 1,
+        "thalach": 150,
+        "exang": 0,
+        "oldpeak": 1.0,
+        "slope": 1,
+        "ca": 0,
+        "thal": 2,
+        "result": "Heart Disease",
+        "confidence": 0.9,
+        "user_id": user_id,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--database-url", default="sqlite://")
+    args = parser.parse_args()
+
+    # Set before app.database reads it
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlalchemy import insert
+
+    from app import models
+    from app.database import Base, SessionLocal, engine
+    from app.history import decode_cursor, history_page
+
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        user = models.User(
+            full_name="Paging Check",
+            email=f"paging-{time.time_ns()}@example.com",
+            hashed_password="-",
+        )
+        db.add(user)
+        db.commit()
+        # One statement, so created_at is the same server timestamp for all
+        db.execute(insert(models.HeartScan), [heart_row(user.id)] * args.rows)
+        db.commit()
+
+        seen = []
+        timings = []
+        cursor = None
+        while len(seen) <= args.rows:
+            start = time.perf_counter()
+            items, next_cursor = history_page(db, user.id, args.limit, cursor)
+            timings.append(time.perf_counter() - start)
+            seen += [item["id"] for item in items]
+            if next_cursor is None:
+                break
+            cursor = decode_cursor(next_cursor)
+
+    for page, seconds in enumerate(timings, 1):
+        print(f"page {page:4d}: {seconds * 1000:7.2f} ms")
+    repeated = len(seen) - len(set(seen))
+    missing = args.rows - len(set(seen))
+    print(
+        f"{len(timings)} pages, {len(seen)} rows,"
+        f" {repeated} repeated, {missing} missing"
+    )
+    sys.exit(1 if repeated or missing else 0)
+
+
+if __name__ == "__main__":
+    main()
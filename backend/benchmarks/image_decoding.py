@@ -0,0 +1,94 @@
+"""
+Latency and peak allocations of the old per-model image preprocessing vs
+preprocessing.decode.
+
+Run from backend/:
+    python -m benchmarks.image_decoding --images 64
+    python -m benchmarks.image_decoding --image path/to/scan.jpg
+"""
+
+import argparse
+import io
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from preprocessing.decode import decode_batch
+
+
+# The preprocessing the brain and Alzheimer paths used before the shared decoder
+def old_brain(image_bytes):
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    img_array = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    resized = cv2.resize(img_array, (150, 150))
+    normalized = resized / 255.0
+    return np.expand_dims(normalized, axis=0)
+
+
+def old_alzhaimer(image_bytes):
+    file_bytes = np.asarray(bytearray(image_bytes), dtype=np.uint8)
+    img = cv2.imdecode(file_bytes, cv2.IMREAD_GRAYSCALE)
+    img_resized = cv2.resize(img, (128, 128))
+    return (img_resized.astype(np.float32) / 255.0)[None, None]
+
+
+def synthetic_jpeg(width, height, seed=0):
+    # Smooth structure plus noise, so the JPEG isn't trivially compressible
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = 127 + 100 * np.sin(x / 37.0) * np.cos(y / 23.0)
+    image = np.clip(base + rng.normal(0, 20, (height, width)), 0, 255).astype(np.uint8)
+    ok, encoded = cv2.imencode(".jpg", cv2.merge([image, image, image]))
+    return encoded.tobytes()
+
+
+def measure(fn, datas):
+    """
+    Seconds per image and peak traced bytes per image (numpy and Python
+    allocations; OpenCV's internal scratch buffers aren't traced).
+    """
+    fn(datas[:1])  # warm up
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(datas)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / len(datas), peak / len(datas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image", help="encoded image to use (default: synthetic)")
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--images", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            data = f.read()
+    else:
+        data = synthetic_jpeg(args.width, args.height)
+    datas = [memoryview(data)] * args.images
+
+    cases = {
+        "brain old": lambda d: np.concatenate([old_brain(x) for x in d]),
+        "brain decode": lambda d: decode_batch(d, (150, 150)),
+        "alzhaimer old": lambda d: np.concatenate([old_alzhaimer(x) for x in d]),
+        "alzhaimer decode": lambda d: decode_batch(d, (128, 128), grayscale=True),
+    }
+    print(f"{len(data) / 1024:.0f} KB image x {args.images}")
+    for name, fn in cases.items():
+        seconds, peak = measure(fn, datas)
+        print(
+            f"{name:18s} {seconds * 1000:7.2f} ms/image"
+            f"  {peak / 1024:8.1f} KB peak/image"
+        )
+
+
+if __name__ == "__main__":
+    main()
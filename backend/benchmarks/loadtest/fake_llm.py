@@ -0,0 +1,105 @@
+"""
+A local stand-in for the Gemini model behind the ADK agents.
+
+install() points every LlmAgent in chat.agents.* at a FakeLlm that waits
+FAKE_LLM_LATENCY_MS +/- FAKE_LLM_JITTER_MS and answers with canned text for
+the agent's output_key. FAKE_LLM_RESPONSES may name a JSON file of
+{output_key: text or [texts]} that overrides the defaults below.
+"""
+
+import asyncio
+import importlib
+import json
+import os
+import random
+
+from google.adk.agents.llm_agent import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "800"))
+FAKE_LLM_JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "200"))
+FAKE_LLM_RESPONSES = os.getenv("FAKE_LLM_RESPONSES")
+AGENT_PACKAGES = ["alzhaimer", "brain", "classify", "general", "heart", "kidney"]
+
+REPORT = (
+    "## Summary\n"
+    "The model result above is consistent with the reported history. "
+    "This is a synthetic report produced for load testing; it has roughly the "
+    "length of a real one so response sizes and streaming are realistic.\n\n"
+    "## Recommendations\n"
+    "- Discuss the result with a specialist.\n"
+    "- Keep a record of symptoms and medications.\n"
+    "- Schedule a follow-up examination.\n"
+)
+ANSWER = (
+    "This is a synthetic answer from the load-test model. A real answer would "
+    "explain the condition, common symptoms and when to see a doctor."
+)
+DEFAULT_RESPONSES = {
+    "disease_class": ["heart", "kidney", "brain", "alzhaimer", "general"],
+}
+
+
+def responses_for(output_key, overrides):
+    texts = overrides.get(output_key) or DEFAULT_RESPONSES.get(output_key)
+    if texts is None:
+        texts = REPORT if output_key.endswith("_report_response") else ANSWER
+    return [texts] if isinstance(texts, str) else list(texts)
+
+
+class FakeLlm(BaseLlm):
+    """Sleeps for a jittered latency, then returns one of `responses`."""
+
+    model: str = "fake-llm"
+    responses: list[str] = [ANSWER]
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    jitter_ms: float = FAKE_LLM_JITTER_MS
+    stream_chunks: int = 8
+
+    async def generate_content_async(self, llm_request, stream=False):
+        text = random.choice(self.responses)
+        jitter = random.uniform(-self.jitter_ms, self.jitter_ms)
+        delay = max(0.0, self.latency_ms + jitter) / 1000
+        if stream:
+            # Partial chunks spread over the latency, then the full text
+            size = -(-len(text) // self.stream_chunks)
+            pieces = [text[i : i + size] for i in range(0, len(text), size)]
+            for piece in pieces:
+                await asyncio.sleep(delay / len(pieces))
+                yield LlmResponse(content=content(piece), partial=True)
+        else:
+            await asyncio.sleep(delay)
+        yield LlmResponse(content=content(text))
+
+
+def content(text):
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+
+def agents():
+    seen = set()
+    for package in AGENT_PACKAGES:
+        module = importlib.import_module(f"chat.agents.{package}.agent")
+        for value in vars(module).values():
+            if isinstance(value, LlmAgent) and id(value) not in seen:
+                seen.add(id(value))
+                yield value
+
+
+def install(latency_ms=FAKE_LLM_LATENCY_MS, jitter_ms=FAKE_LLM_JITTER_MS):
+    """Swap the model of every chat agent for a FakeLlm; returns how many."""
+    overrides = {}
+    if FAKE_LLM_RESPONSES:
+        with open(FAKE_LLM_RESPONSES) as f:
+            overrides = json.load(f)
+    count = 0
+    for agent in agents():
+        agent.model = FakeLlm(
+            responses=responses_for(agent.output_key, overrides),
+            latency_ms=latency_ms,
+            jitter_ms=jitter_ms,
+        )
+        count += 1
+    return count
@@ -0,0 +1,116 @@
+import struct
+import uuid
+
+import cv2
+import numpy as np
+
+# Valid values for the categorical kidney fields (preprocessing.kidney)
+KIDNEY_CHOICES = {
+    "red_blood_cells": ["normal", "abnormal"],
+    "pus_cell": ["normal", "abnormal"],
+    "pus_cell_clumps": ["notpresent", "present"],
+    "bacteria": ["notpresent", "present"],
+    "hypertension": ["no", "yes"],
+    "diabetes_mellitus": ["no", "yes"],
+    "coronary_artery_disease": ["no", "yes"],
+    "appetite": ["poor", "good"],
+    "peda_edema": ["no", "yes"],
+    "aanemia": ["no", "yes"],
+}
+
+
+def mri_image(rng, size=256):
+    """A smooth grayscale JPEG about the size of a real scan upload."""
+    coarse = rng.random((size // 16, size // 16), dtype=np.float32)
+    image = cv2.resize(coarse, (size, size), interpolation=cv2.INTER_CUBIC)
+    image = np.clip(image * 255, 0, 255).astype(np.uint8)
+    _, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes()
+
+
+class Payloads:
+    """
+    Synthetic request bodies. `unique_images` distinct scans are cycled, so
+    the prediction cache hit rate can be set from the command line (vivek
+    uploads use unique_image, so they always miss).
+    """
+
+    def __init__(self, unique_images=64, seed=0):
+        generator = np.random.default_rng(seed)
+        self.images = [mri_image(generator) for _ in range(unique_images)]
+
+    def image(self, rng):
+        return rng.choice(self.images)
+
+    def unique_image(self, rng):
+        """
+        A pooled scan with a random JPEG comment after the start-of-image
+        marker: same pixels, new content hash, for routes that short-cut
+        repeated uploads.
+        """
+        image = self.image(rng)
+        comment = uuid.UUID(int=rng.getrandbits(128)).hex.encode()
+        segment = b"\xff\xfe" + struct.pack(">H", len(comment) + 2) + comment
+        return image[:2] + segment + image[2:]
+
+    @staticmethod
+    def patient(rng):
+        return {
+            "patientName": f"Patient {rng.randrange(10000)}",
+            "age": rng.randint(20, 90),
+            "gender": rng.choice(["male", "female"]),
+            "hospitalName": "Load Test Hospital",
+        }
+
+    @staticmethod
+    def heart(rng):
+        return {
+            "age": rng.randint(29, 77),
+            "sex": rng.randint(0, 1),
+            "cp": rng.randint(0, 3),
+            "trestbps": rng.randint(94, 200),
+            "chol": rng.randint(126, 564),
+            "fbs": rng.randint(0, 1),
+            "restecg": rng.randint(0, 2),
+            "thalach": rng.randint(71, 202),
+            "exang": rng.randint(0, 1),
+            "oldpeak": round(rng.uniform(0, 6.2), 1),
+            "slope": rng.randint(0, 2),
+            "ca": rng.randint(0, 4),
+            "thal": rng.randint(0, 3),
+        }
+
+    @staticmethod
+    def kidney(rng):
+        row = {
+            "age": rng.randint(2, 90),
+            "blood_pressure": rng.randint(50, 180),
+            "specific_gravity": rng.choice([1.005, 1.01, 1.015, 1.02, 1.025]),
+            "albumin": rng.randint(0, 5),
+            "sugar": rng.randint(0, 5),
+            "blood_glucose_random": rng.randint(22, 490),
+            "blood_urea": rng.randint(1, 391),
+            "serum_creatinine": round(rng.uniform(0.4, 15.0), 1),
+            "sodium": rng.randint(111, 163),
+            "potassium": round(rng.uniform(2.5, 7.6), 1),
+            "haemoglobin": round(rng.uniform(3.1, 17.8), 1),
+            "packed_cell_volume": rng.randint(9, 54),
+            "white_blood_cell_count": rng.randint(2200, 26400),
+            "red_blood_cell_count": round(rng.uniform(2.1, 8.0), 1),
+        }
+        for field, values in KIDNEY_CHOICES.items():
+            row[field] = rng.choice(values)
+        return row
+
+    @staticmethod
+    def question(rng):
+        return rng.choice(
+            [
+                "What are the early signs of a heart attack?",
+                "How is chronic kidney disease diagnosed?",
+                "Can a brain tumor cause headaches every morning?",
+                "My grandmother keeps forgetting names, is it dementia?",
+                "How much water should I drink a day?",
+                "I feel dizzy and my chest hurts when I climb stairs",
+            ]
+        )
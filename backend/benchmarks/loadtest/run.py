@@ -0,0 +1,330 @@
+"""
+Closed-loop load test of test_app or app.vivek with a fake LLM.
+
+Run from backend/:
+    python -m benchmarks.loadtest.run test_app --concurrency 16 --duration 30
+    python -m benchmarks.loadtest.run vivek --endpoints predict-heart history \
+        --save results/vivek.json
+    python -m benchmarks.loadtest.run test_app --baseline results/base.json
+
+Unless --url is given, the app is started with benchmarks.loadtest.serve
+(fake LLM, SQLite or --database-url). --concurrency virtual users send
+requests back to back, cycling through --endpoints, for --duration seconds
+after a --warmup period that is not measured. Latency percentiles and
+requests/s are printed per endpoint. --save writes them as JSON;
+--baseline compares against such a file and exits 1 when p95 latency or
+throughput regressed by more than --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+
+from .payloads import Payloads
+
+REQUEST_TIMEOUT = 120.0
+JOB_WAIT_SECONDS = 30
+READY_PATHS = {"test_app": "/ready", "vivek": "/"}
+
+
+# ----------- test_app scenarios -------------
+async def image_report(client, rng, payloads, auth, path, field):
+    files = {field: ("scan.jpg", payloads.image(rng), "image/jpeg")}
+    data = {"patient_data": json.dumps(payloads.patient(rng))}
+    return await client.post(path, files=files, data=data)
+
+
+async def tabular_report(client, rng, payloads, auth, path, form):
+    data = {
+        "formData": json.dumps(form(rng)),
+        "additionalInfo": json.dumps(payloads.patient(rng)),
+    }
+    return await client.post(path, data=data)
+
+
+async def chatbot(client, rng, payloads, auth):
+    return await client.post("/test/chatbot", params={"query": payloads.question(rng)})
+
+
+async def heart_job(client, rng, payloads, auth):
+    """Submit, then long-poll until the job is done: end-to-end job latency."""
+    response = await tabular_report(
+        client, rng, payloads, auth, "/jobs/heart", payloads.heart
+    )
+    if response.status_code != 202:
+        return response
+    path = response.headers["Location"]
+    while True:
+        response = await client.get(path, params={"wait": JOB_WAIT_SECONDS})
+        if response.status_code != 200 or response.json()["status"] in (
+            "succeeded",
+            "failed",
+        ):
+            return response
+
+
+# ----------- vivek scenarios -------------
+async def vivek_upload(client, rng, payloads, auth, path):
+    # A user's repeat of an image returns the stored scan without scoring it,
+    # so send new bytes to measure the full upload path
+    filename = f"scan-{uuid.uuid4().hex}.jpg"
+    files = {"file": (filename, payloads.unique_image(rng), "image/jpeg")}
+    return await client.post(path, files=files, headers=auth)
+
+
+async def vivek_predict(client, rng, payloads, auth, path, form):
+    return await client.post(path, json=form(rng), headers=auth)
+
+
+async def vivek_history(client, rng, payloads, auth):
+    return await client.get("/history", params={"limit": 20}, headers=auth)
+
+
+def scenario(function, *args):
+    return lambda client, rng, payloads, auth: function(
+        client, rng, payloads, auth, *args
+    )
+
+
+SCENARIOS = {
+    "test_app": {
+        "alzhaimer": scenario(image_report, "/test/alzhaimer", "image_file"),
+        "brain": scenario(image_report, "/test/brain", "image"),
+        "heart": scenario(tabular_report, "/test/heart", Payloads.heart),
+        "kidney": scenario(tabular_report, "/test/kidney", Payloads.kidney),
+        "chatbot": chatbot,
+        "heart-job": heart_job,
+    },
+    "vivek": {
+        "upload-mri": scenario(vivek_upload, "/upload-mri"),
+        "upload-brain-mri": scenario(vivek_upload, "/upload-brain-mri"),
+        "predict-heart": scenario(vivek_predict, "/predict-heart", Payloads.heart),
+        "predict-kidney": scenario(vivek_predict, "/predict-kidney", Payloads.kidney),
+        "history": vivek_history,
+    },
+}
+
+
+async def login(app, client):
+    """Headers for the authenticated vivek routes (a fresh user per run)."""
+    if app != "vivek":
+        return {}
+    user = {
+        "full_name": "Load Test",
+        "email": f"loadtest-{uuid.uuid4().hex[:8]}@example.com",
+        "password": "loadtest-password",
+    }
+    (await client.post("/register", json=user)).raise_for_status()
+    credentials = {"email": user["email"], "password": user["password"]}
+    response = await client.post("/login", json=credentials)
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def succeeded(response):
+    # A finished job answers 200 either way; its status says how it went
+    if response.is_success and response.url.path.startswith("/jobs/"):
+        return response.json().get("status") == "succeeded"
+    return response.is_success
+
+
+async def drive(url, app, endpoints, concurrency, duration, warmup, payloads):
+    """(endpoint -> [latency seconds], endpoint -> errors) over the window."""
+    latencies = {name: [] for name in endpoints}
+    errors = dict.fromkeys(endpoints, 0)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=url, timeout=REQUEST_TIMEOUT, limits=limits
+    ) as client:
+        auth = await login(app, client)
+        measure_from = time.perf_counter() + warmup
+        stop = measure_from + duration
+
+        async def user(index):
+            rng = random.Random(index)
+            turn = index
+            while time.perf_counter() < stop:
+                name = endpoints[turn % len(endpoints)]
+                turn += 1
+                started = time.perf_counter()
+                try:
+                    response = await SCENARIOS[app][name](client, rng, payloads, auth)
+                    ok = succeeded(response)
+                except httpx.HTTPError:
+                    ok = False
+                if started < measure_from:
+                    continue
+                if ok:
+                    latencies[name].append(time.perf_counter() - started)
+                else:
+                    errors[name] += 1
+
+        await asyncio.gather(*(user(index) for index in range(concurrency)))
+    return latencies, errors
+
+
+def summarize(latencies, errors, duration):
+    results = {}
+    for name, timings in latencies.items():
+        timings = np.array(timings) * 1000
+        stats = {
+            "requests": int(len(timings)),
+            "errors": errors[name],
+            "rps": len(timings) / duration,
+        }
+        for percentile in (50, 95, 99):
+            value = np.percentile(timings, percentile) if len(timings) else None
+            stats[f"p{percentile}_ms"] = None if value is None else float(value)
+        results[name] = stats
+    return results
+
+
+def print_results(results):
+    print(
+        f"{'endpoint':18s} {'requests':>8s} {'errors':>6s} {'rps':>8s}"
+        f" {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}"
+    )
+    for name, stats in results.items():
+        percentiles = "".join(
+            f" {stats[key]:9.1f}" if stats[key] is not None else f" {'-':>9s}"
+            for key in ("p50_ms", "p95_ms", "p99_ms")
+        )
+        print(
+            f"{name:18s} {stats['requests']:8d} {stats['errors']:6d}"
+            f" {stats['rps']:8.2f}{percentiles}"
+        )
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against a saved run; returns the regressed endpoints."""
+    regressed = []
+    print(f"\nvs baseline ({baseline['meta']['timestamp']}):")
+    for name, stats in results.items():
+        before = baseline["endpoints"].get(name)
+        if before is None or not before["requests"] or not stats["requests"]:
+            continue
+        p95 = stats["p95_ms"] / before["p95_ms"] - 1
+        rps = stats["rps"] / before["rps"] - 1
+        worse = p95 > tolerance or rps < -tolerance
+        if worse:
+            regressed.append(name)
+        print(
+            f"{name:18s} p95 {p95:+7.1%}  rps {rps:+7.1%}"
+            f"{'  REGRESSED' if worse else ''}"
+        )
+    return regressed
+
+
+def start_server(args):
+    env = dict(
+        os.environ,
+        FAKE_LLM_LATENCY_MS=str(args.llm_latency_ms),
+        FAKE_LLM_JITTER_MS=str(args.llm_jitter_ms),
+        WARMUP="all",
+    )
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.loadtest.serve",
+        args.app,
+        "--port",
+        str(args.port),
+    ]
+    if args.database_url:
+        command += ["--database-url", args.database_url]
+    return subprocess.Popen(command, env=env)
+
+
+def wait_ready(url, app, server, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            if httpx.get(url + READY_PATHS[app], timeout=5).is_success:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("app", choices=list(SCENARIOS))
+    parser.add_argument("--endpoints", nargs="+", help="default: all for the app")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--unique-images", type=int, default=64)
+    parser.add_argument("--url", help="an already running server")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--database-url", help="default: SQLite in a temp dir")
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200.0)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a saved JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    endpoints = args.endpoints or list(SCENARIOS[args.app])
+    unknown = set(endpoints) - set(SCENARIOS[args.app])
+    if unknown:
+        parser.error(f"unknown endpoints for {args.app}: {', '.join(sorted(unknown))}")
+
+    server = None if args.url else start_server(args)
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    try:
+        wait_ready(url, args.app, server)
+        latencies, errors = asyncio.run(
+            drive(
+                url,
+                args.app,
+                endpoints,
+                args.concurrency,
+                args.duration,
+                args.warmup,
+                Payloads(args.unique_images),
+            )
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results = summarize(latencies, errors, args.duration)
+    print_results(results)
+    run = {
+        "meta": {
+            "app": args.app,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter_ms": args.llm_jitter_ms,
+            "unique_images": args.unique_images,
+        },
+        "endpoints": results,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(run, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressed = compare(results, json.load(f), args.tolerance)
+        sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Run test_app or app.vivek against the fake LLM and a local database.
+
+Run from backend/ (benchmarks.loadtest.run starts it for you):
+    python -m benchmarks.loadtest.serve test_app --port 9100
+    python -m benchmarks.loadtest.serve vivek --database-url postgresql://localhost/drml
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+APPS = {"test_app": "test_app:app", "vivek": "app.vivek:app"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("app", choices=list(APPS))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--workdir", help="SQLite files and uploads (default: temp)")
+    parser.add_argument("--database-url", help="default: SQLite in --workdir")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="loadtest-"))
+    os.makedirs(workdir, exist_ok=True)
+    # Set before the apps load .env, which never overrides the environment
+    os.environ["DATABASE_URL"] = args.database_url or (
+        f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    )
+    os.environ["JOBS_DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'jobs.db')}"
+    os.environ.setdefault("MODEL", "fake-llm")
+    # vivek keeps uploads in directories relative to the working directory,
+    # so run from workdir with backend/ still importable
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.chdir(workdir)
+
+    from .fake_llm import install
+
+    print(f"fake LLM serving {install()} agents, data in {workdir}")
+
+    import uvicorn
+
+    uvicorn.run(APPS[args.app], host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
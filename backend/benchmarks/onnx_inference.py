@@ -0,0 +1,64 @@
+"""
+Latency and throughput of the native (Keras / PyTorch) image models vs their
+ONNX Runtime exports.
+
+Run from backend/ after `python -m preprocessing.export_onnx`:
+    python -m benchmarks.onnx_inference --models brain alzhaimer --batch-sizes 1 32
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from preprocessing.export_onnx import native_predictor
+from preprocessing.onnx_backend import ONNX_MODELS, OnnxModel
+
+
+def random_batch(name, batch_size):
+    _, (width, height), grayscale = ONNX_MODELS[name]
+    shape = (1, height, width) if grayscale else (height, width, 3)
+    return np.random.default_rng(0).random((batch_size, *shape), dtype=np.float32)
+
+
+def bench(predict, batch, repeats):
+    predict(batch)  # warm up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(batch)
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings)
+    return {
+        "p50_ms": float(np.percentile(timings, 50) * 1000),
+        "p95_ms": float(np.percentile(timings, 95) * 1000),
+        "images_per_s": len(batch) / float(timings.mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models", nargs="+", default=list(ONNX_MODELS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 32])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    for name in args.models:
+        backends = {
+            "native": native_predictor(name),
+            "onnx": OnnxModel(ONNX_MODELS[name][0]).run,
+        }
+        for batch_size in args.batch_sizes:
+            batch = random_batch(name, batch_size)
+            for backend, predict in backends.items():
+                result = bench(predict, batch, args.repeats)
+                print(
+                    f"{name:10s} {backend:6s} batch={batch_size:<3d}"
+                    f" p50={result['p50_ms']:8.2f} ms"
+                    f" p95={result['p95_ms']:8.2f} ms"
+                    f" {result['images_per_s']:8.1f} images/s"
+                )
+
+
+if __name__ == "__main__":
+    main()
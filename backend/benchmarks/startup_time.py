@@ -0,0 +1,73 @@
+"""
+Startup time of test_app with lazy report modules vs importing them all
+up front (the old behaviour).
+
+Run from backend/:
+    python -m benchmarks.startup_time --runs 5
+    python -m benchmarks.startup_time --serve --port 8765
+
+Each import is timed in a fresh interpreter. --serve also starts uvicorn and
+measures the time until the server answers /ready.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+EAGER = "import report.alzhaimer, report.brain, report.heart, report.kidney"
+EAGER += ", report.chatbot"
+
+
+def import_seconds(eager):
+    code = "import time; start = time.perf_counter(); import test_app; "
+    if eager:
+        code += EAGER + "; "
+    code += "print(time.perf_counter() - start)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def ready_seconds(port, timeout=120):
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "test_app:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1)
+                return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.05)
+        raise TimeoutError(f"server not ready after {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--serve", action="store_true", help="also time /ready")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for label, eager in (("lazy", False), ("eager", True)):
+        timings = [import_seconds(eager) for _ in range(args.runs)]
+        print(f"import {label:5s} median={statistics.median(timings) * 1000:8.1f} ms")
+
+    if args.serve:
+        timings = [ready_seconds(args.port) for _ in range(args.runs)]
+        print(f"/ready       median={statistics.median(timings) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
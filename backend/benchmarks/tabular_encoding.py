@@ -0,0 +1,127 @@
+"""
+Previous pandas preprocessing vs the compiled FeatureEncoder.
+
+Run from backend/:
+    python -m benchmarks.tabular_encoding --rows 1000
+"""
+
+import argparse
+import random
+import timeit
+
+import pandas as pd
+
+from preprocessing import heart, kidney
+
+HEART_ROW = {
+    "age": 54,
+    "sex": 1,
+    "cp": 2,
+    "trestbps": 130,
+    "chol": 246,
+    "fbs": 0,
+    "restecg": 1,
+    "thalach": 150,
+    "exang": 0,
+    "oldpeak": 1.0,
+    "slope": 1,
+    "ca": 0,
+    "thal": 2,
+}
+
+KIDNEY_ROW = {
+    "age": 48,
+    "blood_pressure": 80,
+    "specific_gravity": 1.02,
+    "albumin": 1,
+    "sugar": 0,
+    "red_blood_cells": "normal",
+    "pus_cell": "normal",
+    "pus_cell_clumps": "notpresent",
+    "bacteria": "notpresent",
+    "blood_glucose_random": 121,
+    "blood_urea": 36,
+    "serum_creatinine": 1.2,
+    "sodium": 137,
+    "potassium": 4.5,
+    "haemoglobin": 15.4,
+    "packed_cell_volume": "44",
+    "white_blood_cell_count": "7800",
+    "red_blood_cell_count": "5.2",
+    "hypertension": "yes",
+    "diabetes_mellitus": "yes",
+    "coronary_artery_disease": "no",
+    "appetite": "good",
+    "peda_edema": "no",
+    "aanemia": "no",
+}
+
+
+def pandas_heart(rows):
+    input_df = pd.get_dummies(
+        pd.DataFrame(rows), columns=heart.CATEGORICAL_FIELDS, drop_first=True
+    )
+    model_columns = heart.get_model_features()
+    for col in model_columns:
+        if col not in input_df.columns:
+            input_df[col] = 0
+    return input_df[model_columns]
+
+
+def pandas_kidney(rows):
+    df = pd.DataFrame(rows)
+    numeric_fields = [
+        "packed_cell_volume",
+        "white_blood_cell_count",
+        "red_blood_cell_count",
+    ]
+    df[numeric_fields] = df[numeric_fields].apply(pd.to_numeric, errors="coerce")
+    for col, mapping in kidney.CATEGORICAL_MAPPINGS.items():
+        df[col] = df[col].map(mapping).fillna(0).astype(int)
+    return df
+
+
+def cohort(row, n, categorical):
+    rows = []
+    for _ in range(n):
+        row = dict(row)
+        for field, values in categorical.items():
+            row[field] = random.choice(values)
+        rows.append(row)
+    return rows
+
+
+def report(name, fn, arg, number):
+    seconds = min(timeit.repeat(lambda: fn(arg), number=number, repeat=5)) / number
+    print(f"{name:32s} {seconds * 1e6:10.1f} us/call")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    heart_rows = cohort(
+        HEART_ROW, args.rows, {"cp": [0, 1, 2, 3], "thal": [0, 1, 2, 3]}
+    )
+    kidney_rows = cohort(KIDNEY_ROW, args.rows, {"appetite": ["good", "poor"]})
+    heart.get_encoder()  # load the feature list outside the timings
+
+    for label, pandas_fn, encoder_fn, row, rows in [
+        ("heart", pandas_heart, heart.prepare_input, HEART_ROW, heart_rows),
+        ("kidney", pandas_kidney, kidney.preprocess_input, KIDNEY_ROW, kidney_rows),
+    ]:
+        print(f"--- {label}")
+        old = report("pandas, 1 row", pandas_fn, [row], args.number)
+        new = report("encoder, 1 row", encoder_fn, row, args.number)
+        print(f"{'speedup':32s} {old / new:10.1f}x")
+        number = max(args.number // 10, 1)
+        old = report(f"pandas, {args.rows} rows", pandas_fn, rows, number)
+        new = report(f"encoder, {args.rows} rows", encoder_fn, rows, number)
+        print(f"{'speedup':32s} {old / new:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Local fast path for the disease-category classifier.
+
+Queries are first matched against keyword rules taken from the category
+descriptions in prompt.py; if exactly one category matches, that label is
+returned. Otherwise a TF-IDF + logistic regression model trained on the
+prompt's few-shot examples (plus any logged LLM classifications) answers
+when its probability clears the threshold. Anything else returns None and
+the caller falls back to the LLM classifier agent.
+
+Evaluate against logged LLM labels (from backend/):
+    python -m chat.agents.classify.local --log classify_log.jsonl
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+
+from chat.agents.classify.prompt import PROMPT
+
+LABELS = ["heart", "kidney", "brain", "alzhaimer", "general"]
+THRESHOLD = float(os.getenv("CLASSIFY_LOCAL_THRESHOLD", "0.7"))
+# JSONL of {"query": ..., "label": ...} written from LLM classifications
+TRAFFIC_LOG = os.getenv("CLASSIFY_TRAFFIC_LOG")
+
+KEYWORDS = {
+    "heart": [
+        "heart",
+        "cardiac",
+        "cardiovascular",
+        "chest pain",
+        "ecg",
+        "ekg",
+        "palpitation",
+        "palpitations",
+        "arrhythmia",
+        "heartbeat",
+        "heart rate",
+        "valve",
+        "angina",
+    ],
+    "kidney": [
+        "kidney",
+        "kidneys",
+        "renal",
+        "nephrology",
+        "creatinine",
+        "dialysis",
+        "urinalysis",
+        "ckd",
+        "gfr",
+        "urea",
+        "kidney stones",
+    ],
+    "brain": [
+        "brain tumor",
+        "glioma",
+        "meningioma",
+        "pituitary",
+        "seizure",
+        "seizures",
+        "stroke",
+        "head trauma",
+        "epilepsy",
+        "brain scan",
+        "brain scans",
+    ],
+    "alzhaimer": [
+        "alzheimer",
+        "alzheimer's",
+        "alzhaimer",
+        "dementia",
+        "demented",
+        "memory loss",
+        "forgetful",
+        "cognitive decline",
+    ],
+}
+
+# Letter boundaries rather than \b so labels like "Mild_Demented" still match
+_KEYWORD_PATTERNS = {
+    label: re.compile(r"(?<![a-z])(" + "|".join(map(re.escape, words)) + r")(?![a-z])")
+    for label, words in KEYWORDS.items()
+}
+
+
+def prompt_examples():
+    """The few-shot (query, label) pairs embedded in the classifier prompt."""
+    return re.findall(r'Input: "(.+?)"\s*Output: (\w+)', PROMPT)
+
+
+def logged_examples(path=TRAFFIC_LOG):
+    if not path or not os.path.exists(path):
+        return []
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [(r["query"], r["label"]) for r in records if r["label"] in LABELS]
+
+
+def log_example(query, label, path=TRAFFIC_LOG):
+    """Record an LLM classification as future training data (opt-in)."""
+    if path and label in LABELS:
+        with open(path, "a") as f:
+            f.write(json.dumps({"query": query, "label": label}) + "\n")
+
+
+def keyword_label(query):
+    text = query.lower()
+    matched = [
+        label for label, pattern in _KEYWORD_PATTERNS.items() if pattern.search(text)
+    ]
+    return matched[0] if len(matched) == 1 else None
+
+
+class LocalClassifier:
+    def __init__(self, examples, threshold=THRESHOLD):
+        self.threshold = threshold
+        # Keyword phrases double as labelled examples for the linear model
+        examples = list(examples) + [
+            (word, label) for label, words in KEYWORDS.items() for word in words
+        ]
+        queries, labels = zip(*examples)
+        self.model = make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True),
+            LogisticRegression(max_iter=1000, C=10.0),
+        )
+        self.model.fit(queries, labels)
+
+    def predict(self, query):
+        """Returns (label, confidence, source)."""
+        label = keyword_label(query)
+        if label is not None:
+            return label, 1.0, "keywords"
+        proba = self.model.predict_proba([query])[0]
+        best = int(proba.argmax())
+        return self.model.classes_[best], float(proba[best]), "model"
+
+    def rank(self, query):
+        """[(label, probability)], most likely first."""
+        label = keyword_label(query)
+        if label is not None:
+            return [(label, 1.0)]
+        proba = self.model.predict_proba([query])[0]
+        order = proba.argsort()[::-1]
+        return [(self.model.classes_[i], float(proba[i])) for i in order]
+
+    def classify(self, query):
+        """The label when confident, otherwise None (ask the LLM)."""
+        label, confidence, _ = self.predict(query)
+        return label if confidence >= self.threshold else None
+
+
+_classifier = None
+
+
+def get_local_classifier():
+    """The serving classifier, trained on first use rather than at import."""
+    global _classifier
+    if _classifier is None:
+        _classifier = LocalClassifier(prompt_examples() + logged_examples())
+    return _classifier
+
+
+def evaluate(classifier, examples):
+    """Accuracy of confident local answers against LLM labels, and coverage."""
+    answered = correct = 0
+    for query, expected in examples:
+        label = classifier.classify(query)
+        if label is not None:
+            answered += 1
+            correct += label == expected
+    return {
+        "examples": len(examples),
+        "coverage": answered / len(examples) if examples else 0.0,
+        "accuracy": correct / answered if answered else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the local classifier")
+    parser.add_argument("--log", default=TRAFFIC_LOG, help="logged LLM labels")
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    logged = logged_examples(args.log)
+    if not logged:
+        parser.error("no logged LLM classifications to evaluate against")
+    random.Random(0).shuffle(logged)
+    split = int(len(logged) * (1 - args.holdout))
+
+    classifier = LocalClassifier(prompt_examples() + logged[:split], args.threshold)
+    print(json.dumps(evaluate(classifier, logged[split:]), indent=2))
+
+
+if __name__ == "__main__":
+    main()
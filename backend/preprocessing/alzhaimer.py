@@ -1,42 +1,101 @@
+import os
 import torch
 import torch.nn as nn
 from torchvision import models
-import cv2
-import numpy as np
 
-# Label mapping
-label_mapping = {
-    0: "Mild_Demented",
-    1: "Moderate_Demented",
-    2: "Non_Demented",
-    3: "Very_Mild_Demented",
-}
+from .decode import decode_batch, with_errors
+from .labels import ALZHAIMER_FOLDERS
+from .registry import MODELS_DIR, registry
+from .tracing import stage
 
+MODEL_PATH = MODELS_DIR / "dementia_classifier.pth"
+INPUT_SIZE = (128, 128)
+DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", min(4, os.cpu_count() or 1)))
+CHANNELS_LAST = os.getenv("ALZHAIMER_CHANNELS_LAST", "0") == "1"
 
-def load_model(model_path, device):
+# Bound intra-op parallelism so concurrent batches don't oversubscribe the CPU
+torch.set_num_threads(TORCH_NUM_THREADS)
+
+# Label mapping (dataset folder names)
+label_mapping = {class_id: folder for folder, class_id in ALZHAIMER_FOLDERS.items()}
+
+
+def load_model(model_path=MODEL_PATH, device=DEVICE):
     model = models.resnet18(pretrained=False)
     model.conv1 = nn.Conv2d(1, 64, kernel_size=7, stride=2, padding=3, bias=False)
     model.fc = nn.Linear(model.fc.in_features, 4)
     model.load_state_dict(torch.load(model_path, map_location=device))
     model.eval()
-    return model.to(device)
+    model = model.to(device)
+    if CHANNELS_LAST:
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+
+registry.register("alzhaimer", MODEL_PATH, load_model, kind="torch")
+
+
+# Shared, process-wide model instance
+def get_model():
+    return registry.get("alzhaimer")
+
+
+def preprocess_batch(image_datas):
+    """Decode encoded images into one (n, 1, 128, 128) tensor, plus errors."""
+    batch, errors = decode_batch(image_datas, INPUT_SIZE, grayscale=True)
+    # Shares memory with the decode buffer
+    return torch.from_numpy(batch).unsqueeze(1), errors
 
 
 def preprocess_image(image_bytes):
-    file_bytes = np.asarray(bytearray(image_bytes), dtype=np.uint8)
-    img = cv2.imdecode(file_bytes, cv2.IMREAD_GRAYSCALE)
-    img_resized = cv2.resize(img, (128, 128))
-    img_normalized = img_resized.astype(np.float32) / 255.0
-    img_tensor = (
-        torch.tensor(img_normalized).unsqueeze(0).unsqueeze(0)
-    )  # Shape: (1, 1, 128, 128)
-    return img_tensor
+    batch, errors = preprocess_batch([image_bytes])
+    if errors[0] is not None:
+        raise errors[0]
+    return batch  # Shape: (1, 1, 128, 128)
 
 
 def predict(image_bytes, model, device):
     input_tensor = preprocess_image(image_bytes).to(device)
-    with torch.no_grad():
+    with torch.inference_mode():
         output = model(input_tensor)
         _, pred = torch.max(output, 1)
         prob = torch.softmax(output, dim=1).squeeze().cpu().numpy()
     return int(pred.item()), label_mapping[int(pred.item())], prob
+
+
+def predict_batch(img_tensors, model, device=DEVICE):
+    """Score a list of (1, 1, 128, 128) tensors in one forward pass."""
+    return predict_tensor(torch.cat(img_tensors), model, device)
+
+
+def predict_tensor(batch, model, device=DEVICE):
+    """Softmax probabilities for an (n, 1, 128, 128) batch, one array per row."""
+    batch = batch.to(device)
+    if CHANNELS_LAST:
+        batch = batch.contiguous(memory_format=torch.channels_last)
+    with torch.inference_mode():
+        probs = torch.softmax(model(batch), dim=1).cpu().numpy()
+    return list(probs)
+
+
+def predict_images(image_datas, model, device=DEVICE):
+    """
+    Decode and score encoded images in one forward pass; images that fail to
+    decode get their exception in place of probabilities.
+    """
+    with stage("decode", disease="alzhaimer"):
+        batch, errors = preprocess_batch(image_datas)
+    probs = []
+    if len(batch):
+        with stage("forward", disease="alzhaimer", backend="native"):
+            probs = predict_tensor(batch, model, device)
+    return with_errors(errors, probs)
+
+
+def predict_probabilities(image_bytes):
+    """Class probabilities for raw image bytes, using the shared model."""
+    result = predict_images([image_bytes], get_model())[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
@@ -0,0 +1,269 @@
+"""
+Score a directory tree of brain or Alzheimer images offline.
+
+Run from backend/:
+    python -m preprocessing.batch_score brain ../data/braintumor-mri/Testing \
+        -o brain_testing.csv
+    python -m preprocessing.batch_score alzhaimer scans/ -o scans.parquet --workers 8
+
+Files are read and decoded in a process pool while the model scores large
+batches in this process, on INFERENCE_BACKEND (or --backend). Rows are written
+as each batch finishes: appended to a CSV, or for a .parquet output added as
+part files in that directory. Images that already have a prediction are
+skipped, so re-running an interrupted job resumes it and retries the images
+that failed to read or decode; the latest row per image counts. When images
+sit in folders named after their class (data/braintumor-mri/Testing/<class>/...),
+a confusion matrix is printed at the end.
+"""
+
+import argparse
+import csv
+import glob
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .decode import with_errors
+from .inference import BACKENDS, backend
+from .onnx_backend import preprocess_batch
+from .labels import ALZHAIMER_FOLDERS, BRAIN_FOLDERS
+
+CLASSES = {"brain": BRAIN_FOLDERS, "alzhaimer": ALZHAIMER_FOLDERS}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+COLUMNS = ["path", "label", "prediction", "class_id", "confidence", "error"]
+
+
+def find_images(root):
+    """Image paths under `root`, relative to it, in a stable order."""
+    paths = []
+    for directory, _, files in os.walk(root):
+        for file in files:
+            if os.path.splitext(file)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.relpath(os.path.join(directory, file), root))
+    return sorted(paths)
+
+
+def decode_chunk(name, root, paths):
+    """Runs in a worker: (batch, errors) for `paths`, errors as strings."""
+    datas, read_errors = [], {}
+    for index, path in enumerate(paths):
+        try:
+            with open(os.path.join(root, path), "rb") as f:
+                datas.append(f.read())
+        except OSError as e:
+            read_errors[index] = str(e)
+            datas.append(b"")
+    batch, errors = preprocess_batch(name, datas)
+    errors = [None if error is None else str(error) for error in errors]
+    for index, error in read_errors.items():
+        errors[index] = error
+    return batch, errors
+
+
+def batch_predictor(name, choice):
+    """`predict(batch) -> probabilities` for a preprocess_batch batch."""
+    if choice == "native":
+        from .export_onnx import native_predictor
+
+        return native_predictor(name)
+    from .onnx_backend import get_model
+
+    return get_model(name, choice).run
+
+
+class CsvOutput:
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return []
+        # A crash mid-write can leave half a row at the end
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+        with open(self.path, newline="") as f:
+            return list(csv.DictReader(f))
+
+    def write(self, rows):
+        header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="") as f:
+            writer = csv.DictWriter(f, COLUMNS)
+            if header:
+                writer.writeheader()
+            writer.writerows(rows)
+
+
+class ParquetOutput:
+    """A directory of part-NNNNN.parquet files, one per scored batch."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def parts(self):
+        return sorted(glob.glob(os.path.join(self.path, "part-*.parquet")))
+
+    def read(self):
+        import pandas as pd
+
+        parts = self.parts()
+        if not parts:
+            return []
+        return pd.concat([pd.read_parquet(part) for part in parts]).to_dict("records")
+
+    def write(self, rows):
+        import pandas as pd
+
+        os.makedirs(self.path, exist_ok=True)
+        part = os.path.join(self.path, f"part-{len(self.parts()):05d}.parquet")
+        # Written aside and renamed, so a crash never leaves a partial part
+        pd.DataFrame(rows, columns=COLUMNS).to_parquet(f"{part}.tmp", index=False)
+        os.replace(f"{part}.tmp", part)
+
+
+def open_output(path):
+    return ParquetOutput(path) if path.endswith(".parquet") else CsvOutput(path)
+
+
+def to_rows(paths, results, classes):
+    names = {class_id: folder for folder, class_id in classes.items()}
+    rows = []
+    for path, result in zip(paths, results):
+        folder = os.path.basename(os.path.dirname(path))
+        row = dict.fromkeys(COLUMNS)
+        row.update(path=path, label=folder if folder in classes else None)
+        if isinstance(result, str):
+            row["error"] = result
+        else:
+            class_id = int(result.argmax())
+            row.update(
+                prediction=names[class_id],
+                class_id=class_id,
+                confidence=float(result[class_id]),
+            )
+        rows.append(row)
+    return rows
+
+
+def latest(rows):
+    """The last row written for each path; a retry supersedes its error row."""
+    return list({row["path"]: row for row in rows}.values())
+
+
+def succeeded(row):
+    # Failed rows read back with an empty prediction: "" from CSV, None or NaN
+    # from Parquet
+    return isinstance(row["prediction"], str) and row["prediction"] != ""
+
+
+def confusion_matrix(rows, classes):
+    """Counts of (true class, predicted class) for rows with a folder label."""
+    matrix = np.zeros((len(classes), len(classes)), dtype=int)
+    for row in rows:
+        if row["label"] in classes and row["prediction"] in classes:
+            matrix[classes[row["label"]], classes[row["prediction"]]] += 1
+    return matrix
+
+
+def print_confusion_matrix(matrix, classes):
+    names = sorted(classes, key=classes.get)
+    width = max(len(name) for name in names) + 2
+    print("rows: true class, columns: predicted")
+    print(" " * width + "".join(f"{i:>8d}" for i in range(len(names))))
+    for i, name in enumerate(names):
+        print(f"{name:<{width}s}" + "".join(f"{count:>8d}" for count in matrix[i]))
+    total = matrix.sum()
+    if total:
+        print(f"accuracy {np.trace(matrix) / total:.4f} over {total} labelled images")
+
+
+def score(name, root, output, choice, workers, batch_size, chunk_size):
+    classes = CLASSES[name]
+    rows = latest(output.read())
+    done = {row["path"] for row in rows if succeeded(row)}
+    todo = [path for path in find_images(root) if path not in done]
+    retried = len(rows) - len(done)
+    print(
+        f"{len(done)} images already scored, {len(todo)} to go"
+        f" ({retried} retried after an error)"
+    )
+    if not todo:
+        return
+
+    predict = batch_predictor(name, choice)
+    chunks = iter([todo[i : i + chunk_size] for i in range(0, len(todo), chunk_size)])
+    scored, start = 0, time.perf_counter()
+    # Spawned workers don't inherit the model framework's threads and locks.
+    # They read DECODE_THREADS on import: one decode thread per process.
+    os.environ["DECODE_THREADS"] = "1"
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        # Keep decoding a few chunks ahead of the model
+        pending = deque()
+
+        def refill():
+            while len(pending) < 2 * workers:
+                paths = next(chunks, None)
+                if paths is None:
+                    return
+                pending.append((paths, pool.submit(decode_chunk, name, root, paths)))
+
+        refill()
+        while pending:
+            paths, batches, errors = [], [], []
+            while pending and len(paths) < batch_size:
+                chunk_paths, future = pending.popleft()
+                batch, chunk_errors = future.result()
+                paths += chunk_paths
+                batches.append(batch)
+                errors += chunk_errors
+                refill()
+
+            batch = np.concatenate(batches) if len(batches) > 1 else batches[0]
+            probs = list(predict(batch)) if len(batch) else []
+            output.write(to_rows(paths, with_errors(errors, probs), classes))
+
+            scored += len(paths)
+            rate = scored / (time.perf_counter() - start)
+            print(f"{len(done) + scored}/{len(done) + len(todo)} {rate:.1f} images/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("model", choices=list(CLASSES))
+    parser.add_argument("root", help="directory tree of images")
+    parser.add_argument("-o", "--output", required=True, help=".csv or .parquet")
+    parser.add_argument("--backend", choices=BACKENDS, help="default: configured")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--chunk-size", type=int, default=32, help="images per task")
+    args = parser.parse_args()
+
+    output = open_output(args.output)
+    choice = args.backend or backend(args.model)
+    start = time.perf_counter()
+    score(
+        args.model,
+        args.root,
+        output,
+        choice,
+        args.workers,
+        args.batch_size,
+        args.chunk_size,
+    )
+    print(f"done in {time.perf_counter() - start:.1f}s")
+
+    rows = latest(output.read())
+    classes = CLASSES[args.model]
+    matrix = confusion_matrix(rows, classes)
+    if matrix.sum():
+        print_confusion_matrix(matrix, classes)
+
+
+if __name__ == "__main__":
+    main()
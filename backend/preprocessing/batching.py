@@ -0,0 +1,103 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import BATCH_SIZE_BUCKETS, histogram
+from .tracing import create_background_task, current_span_context, linked_span
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-item requests into one model call.
+
+    `predict_batch` is a blocking function taking a list of inputs and
+    returning one result per input, in order; returning an exception
+    instance for an input fails just that request. A batch is flushed as soon as
+    it holds `max_batch_size` items or `max_wait_ms` has passed since its
+    first item arrived. Model calls run on a dedicated single-thread executor
+    so the event loop keeps serving while a batch is being scored.
+    """
+
+    def __init__(self, name, predict_batch, max_batch_size=32, max_wait_ms=10.0):
+        self.name = name
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batch_size_hist = histogram(
+            f"{name}_batch_size", BATCH_SIZE_BUCKETS, "Items per model call"
+        )
+        self.queue_wait_hist = histogram(
+            f"{name}_queue_wait_seconds", description="Time from submit to batch start"
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"{name}-batcher"
+        )
+        self._loop = None
+        self._queue = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = create_background_task(loop, self._run())
+
+    async def submit(self, item):
+        self._ensure_worker()
+        future = self._loop.create_future()
+        enqueued = time.perf_counter()
+        await self._queue.put((item, future, enqueued, current_span_context()))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Requests whose client went away are dropped before scoring
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued, _ in batch:
+                self.queue_wait_hist.observe(started - enqueued)
+            self.batch_size_hist.observe(len(batch))
+
+            items = [item for item, _, _, _ in batch]
+            # One span per model call, linked to every request in the batch;
+            # stages timed on the executor thread become its children
+            requests = [span_context for _, _, _, span_context in batch]
+            try:
+                with linked_span(
+                    f"{self.name}_batch", requests, batch_size=len(batch)
+                ) as context:
+                    results = await self._loop.run_in_executor(
+                        self._executor, context.run, self.predict_batch, items
+                    )
+            except Exception as e:
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _, _), result in zip(batch, results):
+                if future.done():
+                    continue
+                # A returned exception fails only that item's request
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
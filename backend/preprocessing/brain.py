@@ -1,30 +1,42 @@
 import numpy as np
-import cv2
 from tensorflow.keras.models import load_model as keras_load_model
-from PIL import Image
-import io
+
+from .decode import decode_batch, with_errors
+from .labels import BRAIN_LABELS
+from .registry import MODELS_DIR, registry
+from .tracing import stage
+
+MODEL_PATH = MODELS_DIR / "brain.h5"
+INPUT_SIZE = (150, 150)
 
 # Label mapping
-label_mapping = {
-    0: "Glioma Tumor",
-    1: "No Tumor",
-    2: "Meningioma Tumor",
-    3: "Pituitary Tumor",
-}
+label_mapping = BRAIN_LABELS
 
 
 # Load model from .h5 file
-def load_model(model_path):
-    return keras_load_model(model_path)
+def load_model(model_path=MODEL_PATH):
+    return keras_load_model(str(model_path))
+
+
+registry.register("brain", MODEL_PATH, load_model, kind="keras")
+
+
+# Shared, process-wide model instance
+def get_model():
+    return registry.get("brain")
+
+
+# Decode encoded images into one (n, 150, 150, 3) float32 BGR batch
+def preprocess_batch(image_datas):
+    return decode_batch(image_datas, INPUT_SIZE)
 
 
 # Preprocess image for prediction
 def preprocess_image(uploaded_file):
-    image = Image.open(uploaded_file).convert("RGB")
-    img_array = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-    resized = cv2.resize(img_array, (150, 150))
-    normalized = resized / 255.0
-    return np.expand_dims(normalized, axis=0)  # Shape: (1, 150, 150, 3)
+    batch, errors = preprocess_batch([uploaded_file.read()])
+    if errors[0] is not None:
+        raise errors[0]
+    return batch  # Shape: (1, 150, 150, 3)
 
 
 # Predict using the model
@@ -34,3 +46,29 @@ def predict(uploaded_file, model):
     pred_index = np.argmax(probs)
     pred_label = label_mapping[pred_index]
     return pred_index, pred_label, probs.tolist()
+
+
+# Predict a list of preprocessed (1, 150, 150, 3) tensors in one model call
+def predict_batch(img_tensors, model):
+    batch = np.concatenate(img_tensors, axis=0).astype(np.float32)
+    return list(model.predict(batch, batch_size=len(batch), verbose=0))
+
+
+# Decode and score encoded images in one model call; images that fail to
+# decode get their exception in place of probabilities
+def predict_images(image_datas, model):
+    with stage("decode", disease="brain"):
+        batch, errors = preprocess_batch(image_datas)
+    probs = []
+    if len(batch):
+        with stage("forward", disease="brain", backend="native"):
+            probs = model.predict(batch, batch_size=len(batch), verbose=0)
+    return with_errors(errors, probs)
+
+
+# Class probabilities for raw image bytes, using the shared model
+def predict_probabilities(image_bytes):
+    result = predict_images([image_bytes], get_model())[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
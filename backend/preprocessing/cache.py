@@ -0,0 +1,79 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from .metrics import counter
+from .registry import registry
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+
+
+def content_hash(data):
+    """SHA-256 of the raw upload bytes, used as the cache and dedupe key."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class PredictionCache:
+    """
+    Model outputs keyed by (disease, content hash, model version).
+
+    Lookups go to an in-process LRU first and then to the optional persistent
+    `store` (an object with `load(disease, digest, model_version)` and
+    `save(disease, digest, model_version, result)`); store hits are promoted
+    into the LRU. The model version comes from the registry, so entries
+    written by an older model file are never returned.
+    """
+
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE, store=None):
+        self.maxsize = maxsize
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = counter("prediction_cache_hits", "Predictions served from cache")
+        self.misses = counter("prediction_cache_misses", "Predictions computed")
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def lookup(self, disease, digest):
+        model_version = registry.version(disease)
+        key = (disease, digest, model_version)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+        if result is None and self.store is not None:
+            result = self.store.load(disease, digest, model_version)
+            if result is not None:
+                self._remember(key, result)
+        (self.misses if result is None else self.hits).inc()
+        return result
+
+    def save(self, disease, digest, probabilities):
+        model_version = registry.version(disease)
+        probabilities = [float(p) for p in probabilities]
+        result = {
+            "class_id": max(range(len(probabilities)), key=probabilities.__getitem__),
+            "probabilities": probabilities,
+            "model_version": model_version,
+        }
+        self._remember((disease, digest, model_version), result)
+        if self.store is not None:
+            self.store.save(disease, digest, model_version, result)
+        return result
+
+    def get_or_compute(self, disease, data, predict_probabilities, digest=None):
+        """Blocking helper: returns the cached result, running the model on a miss."""
+        digest = digest or content_hash(data)
+        result = self.lookup(disease, digest)
+        if result is None:
+            result = self.save(disease, digest, predict_probabilities(data))
+        return result
+
+
+prediction_cache = PredictionCache()
@@ -0,0 +1,118 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Let libjpeg downscale by 2/4/8 while decoding when the target is that small.
+# Off by default: it changes the pixels the models see. Measure the effect on
+# predictions with benchmarks.decode_parity before turning it on.
+DECODE_REDUCED = os.getenv("DECODE_REDUCED", "0") == "1"
+DECODE_THREADS = int(os.getenv("DECODE_THREADS", str(min(4, os.cpu_count() or 1))))
+# Enough of the file for PIL to read the dimensions from the header
+HEADER_BYTES = 64 * 1024
+
+SCALE = np.float32(1 / 255.0)
+
+# Color images are the brain model's, which was served through PIL: like
+# PIL, leave the EXIF orientation alone. Grayscale (Alzheimer) always went
+# through cv2.imdecode, which applies it.
+_KEEP_ORIENTATION = cv2.IMREAD_IGNORE_ORIENTATION
+
+# grayscale -> (full-size flag, {scale factor: reduced flag})
+_FLAGS = {
+    False: (
+        cv2.IMREAD_COLOR | _KEEP_ORIENTATION,
+        {
+            2: cv2.IMREAD_REDUCED_COLOR_2 | _KEEP_ORIENTATION,
+            4: cv2.IMREAD_REDUCED_COLOR_4 | _KEEP_ORIENTATION,
+            8: cv2.IMREAD_REDUCED_COLOR_8 | _KEEP_ORIENTATION,
+        },
+    ),
+    True: (
+        cv2.IMREAD_GRAYSCALE,
+        {
+            2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+            4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+            8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+        },
+    ),
+}
+
+# cv2 releases the GIL, so batch images decode in parallel
+_pool = ThreadPoolExecutor(max_workers=DECODE_THREADS, thread_name_prefix="decode")
+
+
+def _reduction(data, size):
+    """Largest JPEG scale factor that still leaves at least `size` pixels."""
+    try:
+        with Image.open(io.BytesIO(data[:HEADER_BYTES])) as image:
+            width, height = image.size
+            is_jpeg = image.format == "JPEG"
+    except (OSError, ValueError):
+        return 1
+    # Other formats are decoded at full size and resized by OpenCV anyway
+    if not is_jpeg:
+        return 1
+    for factor in (8, 4, 2):
+        if width // factor >= size[0] and height // factor >= size[1]:
+            return factor
+    return 1
+
+
+def decode_image(data, size, grayscale=False):
+    """
+    Decode encoded image bytes (bytes, bytearray or memoryview, read without
+    copying) to a uint8 BGR or grayscale array resized to `size` (w, h).
+    """
+    full, reduced = _FLAGS[grayscale]
+    factor = _reduction(data, size) if DECODE_REDUCED else 1
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    image = cv2.imdecode(buffer, reduced.get(factor, full))
+    if image is None:
+        raise ValueError("Could not decode image")
+    if (image.shape[1], image.shape[0]) != tuple(size):
+        image = cv2.resize(image, tuple(size))
+    return image
+
+
+def decode_into(data, out, grayscale=False):
+    """Decode and scale to [0, 1] directly into the float32 array `out`."""
+    height, width = out.shape[:2]
+    np.multiply(decode_image(data, (width, height), grayscale), SCALE, out=out)
+
+
+def decode_batch(datas, size, grayscale=False):
+    """
+    Decode a list of images into one float32 batch of shape (n, h, w) for
+    grayscale or (n, h, w, 3) for color.
+
+    Returns (batch, errors): errors[i] is the exception raised decoding
+    datas[i], or None; the batch only holds the images that decoded.
+    """
+    width, height = size
+    shape = (len(datas), height, width) + (() if grayscale else (3,))
+    batch = np.empty(shape, dtype=np.float32)
+
+    def decode_row(index):
+        try:
+            decode_into(datas[index], batch[index], grayscale)
+        except (ValueError, cv2.error) as e:
+            return e
+        return None
+
+    if len(datas) == 1:
+        errors = [decode_row(0)]
+    else:
+        errors = list(_pool.map(decode_row, range(len(datas))))
+    if any(errors):
+        batch = batch[[error is None for error in errors]]
+    return batch, errors
+
+
+def with_errors(errors, outputs):
+    """Per-image results in input order: an output, or the decode error."""
+    outputs = iter(outputs)
+    return [next(outputs) if error is None else error for error in errors]
@@ -0,0 +1,78 @@
+import numpy as np
+
+NUMERIC, ONE_HOT, MAPPED = "numeric", "one_hot", "mapped"
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _floats(values):
+    """A float32 column; values that don't parse become NaN."""
+    try:
+        return np.asarray(values, dtype=np.float32)
+    except (TypeError, ValueError):
+        # Some value isn't a number: fall back to converting one by one
+        floats = map(_to_float, values)
+        return np.fromiter(floats, dtype=np.float32, count=len(values))
+
+
+class FeatureEncoder:
+    """
+    Turns input dicts into a contiguous float32 matrix in a fixed column order.
+
+    The encoder is compiled once from the model's column list into a plan of
+    numeric, one-hot and mapped categorical columns. Encoding gathers each
+    input field once for the whole batch and fills every column with NumPy
+    operations over it, with no DataFrame. Columns named "<field>_<value>"
+    with `field` in `one_hot_fields` are one-hot indicators; fields in
+    `mappings` are encoded with their dict and unknown values become 0.
+    """
+
+    def __init__(self, columns, mappings=None, one_hot_fields=()):
+        self.columns = list(columns)
+        self._plan = []  # (column index, kind, field, one-hot value or mapping)
+
+        mappings = mappings or {}
+        for j, col in enumerate(self.columns):
+            field, _, value = col.rpartition("_")
+            if field in one_hot_fields:
+                self._plan.append((j, ONE_HOT, field, float(value)))
+            elif col in mappings:
+                self._plan.append((j, MAPPED, col, mappings[col]))
+            else:
+                self._plan.append((j, NUMERIC, col, None))
+
+    def encode(self, rows):
+        """Encode one dict -> (1, n_columns) or a list of dicts -> (n, n_columns)."""
+        if isinstance(rows, dict):
+            rows = [rows]
+        X = np.zeros((len(rows), len(self.columns)), dtype=np.float32)
+        raw, floats = {}, {}
+
+        for j, kind, field, arg in self._plan:
+            if field not in raw:
+                raw[field] = [row[field] for row in rows]
+            if kind == MAPPED:
+                values = np.array(raw[field], dtype=object)
+                for category, code in arg.items():
+                    X[values == category, j] = code
+                continue
+            if field not in floats:
+                floats[field] = _floats(raw[field])
+            X[:, j] = floats[field] if kind == NUMERIC else floats[field] == arg
+        return X
+
+    def model_input(self, model, X):
+        """
+        X as the model expects it: models fitted on a DataFrame get one with
+        the same column names (no copy), so scikit-learn doesn't warn.
+        """
+        if getattr(model, "feature_names_in_", None) is None:
+            return X
+        import pandas as pd
+
+        return pd.DataFrame(X, columns=self.columns, copy=False)
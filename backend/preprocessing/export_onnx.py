@@ -0,0 +1,129 @@
+"""
+Export brain.h5 and dementia_classifier.pth to ONNX and check parity.
+
+Run from backend/ (the Keras export needs `pip install tf2onnx`):
+    python -m preprocessing.export_onnx
+    python -m preprocessing.export_onnx --models alzhaimer --samples 64
+
+After exporting, both graphs are scored against the native model on random
+inputs (and on images from --images, if given); the command fails if any
+class probability differs by more than --tolerance.
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+
+from .decode import decode_batch
+from .onnx_backend import ONNX_MODELS, OnnxModel
+
+OPSET = 17
+
+
+def export_brain(path):
+    import tensorflow as tf
+    import tf2onnx
+
+    from .brain import get_model
+
+    (_, size, _) = ONNX_MODELS["brain"]
+    spec = (tf.TensorSpec((None, size[1], size[0], 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(
+        get_model(), input_signature=spec, opset=OPSET, output_path=str(path)
+    )
+
+
+def export_alzhaimer(path):
+    import torch
+
+    from .alzhaimer import get_model
+
+    (_, size, _) = ONNX_MODELS["alzhaimer"]
+    # The ResNet outputs logits; bake the softmax into the graph
+    model = torch.nn.Sequential(get_model().cpu(), torch.nn.Softmax(dim=1)).eval()
+    torch.onnx.export(
+        model,
+        torch.zeros(1, 1, size[1], size[0]),
+        str(path),
+        input_names=["input"],
+        output_names=["probabilities"],
+        dynamic_axes={"input": {0: "batch"}, "probabilities": {0: "batch"}},
+        opset_version=OPSET,
+    )
+
+
+def native_predictor(name):
+    """Native probabilities for a preprocessed ONNX-layout batch."""
+    if name == "brain":
+        from .brain import get_model
+
+        model = get_model()
+        return lambda batch: model.predict(batch, batch_size=len(batch), verbose=0)
+
+    import torch
+
+    from .alzhaimer import get_model, predict_tensor
+
+    model = get_model()
+    return lambda batch: np.stack(predict_tensor(torch.from_numpy(batch), model))
+
+
+def parity_inputs(name, samples, images_dir=None):
+    _, size, grayscale = ONNX_MODELS[name]
+    width, height = size
+    shape = (samples, 1, height, width) if grayscale else (samples, height, width, 3)
+    batches = [np.random.default_rng(0).random(shape, dtype=np.float32)]
+    if images_dir:
+        pattern = os.path.join(images_dir, "**", "*.*")
+        paths = sorted(glob.glob(pattern, recursive=True))
+        datas = []
+        for path in paths[:samples]:
+            with open(path, "rb") as f:
+                datas.append(f.read())
+        batch, _ = decode_batch(datas, size, grayscale)
+        if len(batch):
+            batches.append(batch[:, np.newaxis] if grayscale else batch)
+    return batches
+
+
+def max_delta(name, samples, images_dir=None):
+    onnx_model = OnnxModel(ONNX_MODELS[name][0])
+    native = native_predictor(name)
+    return max(
+        float(np.abs(onnx_model.run(batch) - native(batch)).max())
+        for batch in parity_inputs(name, samples, images_dir)
+    )
+
+
+EXPORTERS = {"brain": export_brain, "alzhaimer": export_alzhaimer}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--models", nargs="+", choices=list(EXPORTERS), default=list(EXPORTERS)
+    )
+    parser.add_argument("--samples", type=int, default=32)
+    parser.add_argument("--images", help="directory of sample images for parity")
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    parser.add_argument("--skip-export", action="store_true", help="only check parity")
+    args = parser.parse_args()
+
+    failed = False
+    for name in args.models:
+        path = ONNX_MODELS[name][0]
+        if not args.skip_export:
+            EXPORTERS[name](path)
+            print(f"exported {name} -> {path}")
+        delta = max_delta(name, args.samples, args.images)
+        ok = delta <= args.tolerance
+        failed |= not ok
+        print(f"{name}: max probability delta {delta:.2e} ({'ok' if ok else 'FAIL'})")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
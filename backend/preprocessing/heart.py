@@ -1,35 +1,56 @@
-import pandas as pd
+import numpy as np
 import joblib
 
+from .encoders import FeatureEncoder
+from .registry import MODELS_DIR, registry
+from .tracing import stage
 
-def load_model():
-    return joblib.load("backend/models/best_svm_model.pkl")
+MODEL_PATH = MODELS_DIR / "best_svm_model.pkl"
+FEATURES_PATH = MODELS_DIR / "svm_model_features.pkl"
 
+registry.register("heart", MODEL_PATH, joblib.load, kind="sklearn")
+registry.register("heart_features", FEATURES_PATH, joblib.load, kind="feature_list")
 
-def get_model_features():
-    return joblib.load("backend/models/svm_model_features.pkl")
+# Categorical inputs one-hot encoded as "<field>_<value>" feature columns
+CATEGORICAL_FIELDS = ["cp", "restecg", "thal"]
 
+_encoder = None
 
-def prepare_input(user_input: dict):
-    """
-    Converts user input into the same feature format used in training.
-    Handles one-hot encoding and reorders columns.
-    """
-    # Step 1: Create DataFrame
-    input_df = pd.DataFrame([user_input])
 
-    # Step 2: One-hot encode like training
-    input_df = pd.get_dummies(
-        input_df, columns=["cp", "restecg", "thal"], drop_first=True
-    )
+def load_model():
+    return registry.get("heart")
+
 
-    # Step 3: Ensure all expected columns exist
+def get_model_features():
+    return registry.get("heart_features")
+
+
+def get_encoder():
+    """Encoder compiled from the saved feature list, rebuilt if it is reloaded."""
+    global _encoder
     model_columns = get_model_features()
-    for col in model_columns:
-        if col not in input_df.columns:
-            input_df[col] = 0  # add missing column with 0
+    if _encoder is None or _encoder.columns != list(model_columns):
+        _encoder = FeatureEncoder(model_columns, one_hot_fields=CATEGORICAL_FIELDS)
+    return _encoder
 
-    # Step 4: Reorder columns to match training
-    input_df = input_df[model_columns]
 
-    return input_df
+def prepare_input(user_input):
+    """
+    Converts user input (a dict or a list of dicts) into the feature matrix
+    used in training: one-hot columns such as `cp_2` are `cp == 2` and the
+    columns follow svm_model_features.pkl (named, if the model was fitted
+    with names).
+    """
+    encoder = get_encoder()
+    return encoder.model_input(load_model(), encoder.encode(user_input))
+
+
+def predict_batch(rows):
+    """Scores many inputs with one predict_proba call -> (labels, confidences)."""
+    model = load_model()
+    with stage("preprocess", disease="heart"):
+        features = prepare_input(rows)
+    with stage("forward", disease="heart", backend="native"):
+        proba = model.predict_proba(features)
+    best = proba.argmax(axis=1)
+    return model.classes_[best], proba[np.arange(len(rows)), best]
@@ -0,0 +1,52 @@
+import importlib
+import os
+
+# "native" (Keras / PyTorch), "onnx" (ONNX Runtime) or "onnx_int8" (its
+# quantized export), overridable per model with BRAIN_BACKEND / ALZHAIMER_BACKEND
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "native")
+BACKENDS = ("native", "onnx", "onnx_int8")
+
+
+def backend(name):
+    choice = os.getenv(f"{name.upper()}_BACKEND", INFERENCE_BACKEND)
+    if choice not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{choice}' for {name}")
+    return choice
+
+
+def model_name(name):
+    """Registry name of the model serving `name`; also the prediction cache key."""
+    choice = backend(name)
+    return name if choice == "native" else f"{name}_{choice}"
+
+
+def image_predictor(name):
+    """
+    Blocking batch scorer `predict(image_datas) -> [probabilities | error]`
+    for "brain" or "alzhaimer" on the configured backend. Only that backend's
+    framework is imported, on the first call.
+    """
+    choice = backend(name)
+
+    def predict(image_datas):
+        if choice != "native":
+            from . import onnx_backend
+
+            return onnx_backend.predict_images(name, image_datas, choice)
+        module = importlib.import_module(f".{name}", __package__)
+        return module.predict_images(image_datas, module.get_model())
+
+    return predict
+
+
+def probability_predictor(name):
+    """`predict(image_bytes) -> probabilities` for a single image."""
+    predict = image_predictor(name)
+
+    def predict_probabilities(image_bytes):
+        result = predict([image_bytes])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return predict_probabilities
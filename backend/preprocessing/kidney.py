@@ -1,48 +1,82 @@
-import pandas as pd
 import joblib
 import numpy as np
 
-# Load all trained models
-all_models = joblib.load("backend/models/kidney.joblib")
+from .encoders import FeatureEncoder
+from .registry import MODELS_DIR, registry
+from .tracing import stage
 
+MODEL_PATH = MODELS_DIR / "kidney.joblib"
 
-# def get_model_names():
-#     """Return a list of available model names."""
-#     return list(all_models.keys())
+# All trained models are stored in one joblib dict (XgBoost is served)
+registry.register("kidney", MODEL_PATH, joblib.load, kind="xgboost")
 
+# Column order the models were trained with
+FEATURES = [
+    "age",
+    "blood_pressure",
+    "specific_gravity",
+    "albumin",
+    "sugar",
+    "red_blood_cells",
+    "pus_cell",
+    "pus_cell_clumps",
+    "bacteria",
+    "blood_glucose_random",
+    "blood_urea",
+    "serum_creatinine",
+    "sodium",
+    "potassium",
+    "haemoglobin",
+    "packed_cell_volume",
+    "white_blood_cell_count",
+    "red_blood_cell_count",
+    "hypertension",
+    "diabetes_mellitus",
+    "coronary_artery_disease",
+    "appetite",
+    "peda_edema",
+    "aanemia",
+]
 
-def load_model():
+# Fixed encoding for categorical fields (to avoid LabelEncoder issues)
+CATEGORICAL_MAPPINGS = {
+    "red_blood_cells": {"normal": 0, "abnormal": 1},
+    "pus_cell": {"normal": 0, "abnormal": 1},
+    "pus_cell_clumps": {"notpresent": 0, "present": 1},
+    "bacteria": {"notpresent": 0, "present": 1},
+    "hypertension": {"no": 0, "yes": 1},
+    "diabetes_mellitus": {"no": 0, "yes": 1},
+    "coronary_artery_disease": {"no": 0, "yes": 1},
+    "appetite": {"poor": 0, "good": 1},
+    "peda_edema": {"no": 0, "yes": 1},
+    "aanemia": {"no": 0, "yes": 1},
+}
+
+ENCODER = FeatureEncoder(FEATURES, mappings=CATEGORICAL_MAPPINGS)
+
+
+def get_model_names():
+    """Return a list of available model names."""
+    return list(registry.get("kidney").keys())
+
+
+def load_model(model_name="XgBoost"):
     """Load model by its name from the joblib file."""
-    return all_models.get("XgBoost")
-
-
-def preprocess_input(user_input_dict):
-    """Preprocess input dictionary into model-ready DataFrame."""
-    df = pd.DataFrame([user_input_dict])
-
-    # Convert numeric string fields
-    numeric_fields = [
-        "packed_cell_volume",
-        "white_blood_cell_count",
-        "red_blood_cell_count",
-    ]
-    df[numeric_fields] = df[numeric_fields].apply(pd.to_numeric, errors="coerce")
-
-    # Fixed encoding for categorical fields (to avoid LabelEncoder issues)
-    mapping_dict = {
-        "red_blood_cells": {"normal": 0, "abnormal": 1},
-        "pus_cell": {"normal": 0, "abnormal": 1},
-        "pus_cell_clumps": {"notpresent": 0, "present": 1},
-        "bacteria": {"notpresent": 0, "present": 1},
-        "hypertension": {"no": 0, "yes": 1},
-        "diabetes_mellitus": {"no": 0, "yes": 1},
-        "coronary_artery_disease": {"no": 0, "yes": 1},
-        "appetite": {"poor": 0, "good": 1},
-        "peda_edema": {"no": 0, "yes": 1},
-        "aanemia": {"no": 0, "yes": 1},
-    }
-
-    for col, mapping in mapping_dict.items():
-        df[col] = df[col].map(mapping).fillna(0).astype(int)
-
-    return df
+    return registry.get("kidney").get(model_name)
+
+
+def preprocess_input(user_input, model_name="XgBoost"):
+    """Encode an input dict (or a list of them) into a model-ready float32 matrix."""
+    features = ENCODER.encode(user_input)
+    return ENCODER.model_input(load_model(model_name), features)
+
+
+def predict_batch(rows, model_name="XgBoost"):
+    """Score many inputs with one predict_proba call -> (labels, confidences)."""
+    model = load_model(model_name)
+    with stage("preprocess", disease="kidney"):
+        features = preprocess_input(rows, model_name)
+    with stage("forward", disease="kidney", backend="native"):
+        proba = model.predict_proba(features)
+    best = proba.argmax(axis=1)
+    return model.classes_[best], proba[np.arange(len(rows)), best]
@@ -0,0 +1,31 @@
+# Output order of the image models: position = class id. Each class is
+# (dataset folder name, label shown to users); every label table is built
+# from these, so a reorder here is the only one there is.
+BRAIN_CLASSES = (
+    ("glioma_tumor", "Glioma Tumor"),
+    ("no_tumor", "No Tumor"),
+    ("meningioma_tumor", "Meningioma Tumor"),
+    ("pituitary_tumor", "Pituitary Tumor"),
+)
+ALZHAIMER_CLASSES = (
+    ("Mild_Demented", "Mild Dementia"),
+    ("Moderate_Demented", "Moderate Dementia"),
+    ("Non_Demented", "No Dementia"),
+    ("Very_Mild_Demented", "Very Mild Dementia"),
+)
+
+
+def labels(classes):
+    """class id -> label"""
+    return {class_id: label for class_id, (_, label) in enumerate(classes)}
+
+
+def folders(classes):
+    """dataset folder name -> class id"""
+    return {folder: class_id for class_id, (folder, _) in enumerate(classes)}
+
+
+BRAIN_LABELS = labels(BRAIN_CLASSES)
+ALZHAIMER_LABELS = labels(ALZHAIMER_CLASSES)
+BRAIN_FOLDERS = folders(BRAIN_CLASSES)
+ALZHAIMER_FOLDERS = folders(ALZHAIMER_CLASSES)
@@ -0,0 +1,139 @@
+import bisect
+import threading
+
+# Default bucket upper bounds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# series name -> metric, shared by every module in the process
+METRICS = {}
+_lock = threading.Lock()
+
+
+def series(name, labels=None):
+    """Prometheus series name, e.g. stage_seconds{disease="brain",stage="decode"}."""
+    if not labels:
+        return name
+    pairs = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return f"{name}{{{pairs}}}"
+
+
+class Histogram:
+    def __init__(self, name, buckets=LATENCY_BUCKETS, description="", labels=None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, total = {}, 0
+            for bound, count in zip(self.buckets, self.counts):
+                total += count
+                cumulative[str(bound)] = total
+            cumulative["+Inf"] = self.count
+            return {
+                "type": "histogram",
+                "description": self.description,
+                "count": self.count,
+                "sum": self.sum,
+                "mean": self.sum / self.count if self.count else None,
+                "buckets": cumulative,
+            }
+
+
+class Counter:
+    def __init__(self, name, description="", labels=None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return {"type": "counter", "description": self.description, "value": self.value}
+
+
+class Gauge:
+    """A value read from `fn` whenever metrics are collected."""
+
+    def __init__(self, name, fn, description="", labels=None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.fn = fn
+
+    def snapshot(self):
+        return {"type": "gauge", "description": self.description, "value": self.fn()}
+
+
+def counter(name, description="", labels=None):
+    """Get or create the process-wide counter called `name` (with `labels`)."""
+    key = series(name, labels)
+    with _lock:
+        if key not in METRICS:
+            METRICS[key] = Counter(name, description, labels)
+        return METRICS[key]
+
+
+def histogram(name, buckets=LATENCY_BUCKETS, description="", labels=None):
+    """Get or create the process-wide histogram called `name` (with `labels`)."""
+    key = series(name, labels)
+    with _lock:
+        if key not in METRICS:
+            METRICS[key] = Histogram(name, buckets, description, labels)
+        return METRICS[key]
+
+
+def gauge(name, fn, description="", labels=None):
+    """Register (or replace) the process-wide gauge called `name`."""
+    key = series(name, labels)
+    with _lock:
+        METRICS[key] = Gauge(name, fn, description, labels)
+        return METRICS[key]
+
+
+def snapshot():
+    return {name: metric.snapshot() for name, metric in list(METRICS.items())}
+
+
+def prometheus_text():
+    """All metrics in the Prometheus text exposition format."""
+    families = {}
+    for metric in list(METRICS.values()):
+        families.setdefault(metric.name, []).append(metric)
+
+    lines = []
+    for name, metrics in sorted(families.items()):
+        data = [(metric, metric.snapshot()) for metric in metrics]
+        kind = data[0][1]["type"]
+        if data[0][1]["description"]:
+            lines.append(f"# HELP {name} {data[0][1]['description']}")
+        lines.append(f"# TYPE {name} {kind}")
+        for metric, values in data:
+            if kind != "histogram":
+                if values["value"] is None:
+                    continue
+                lines.append(f"{series(name, metric.labels)} {values['value']}")
+                continue
+            for bound, count in values["buckets"].items():
+                labels = {**metric.labels, "le": bound}
+                lines.append(f"{series(name + '_bucket', labels)} {count}")
+            lines.append(f"{series(name + '_sum', metric.labels)} {values['sum']}")
+            lines.append(f"{series(name + '_count', metric.labels)} {values['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+
+from .decode import decode_batch, with_errors
+from .registry import MODELS_DIR, registry
+from .tracing import stage
+
+ORT_NUM_THREADS = int(os.getenv("ORT_NUM_THREADS", str(min(4, os.cpu_count() or 1))))
+
+# name -> (exported model, input size, grayscale). Both graphs take float32
+# pixels in [0, 1] and output class probabilities; see export_onnx.py.
+ONNX_MODELS = {
+    "brain": (MODELS_DIR / "brain.onnx", (150, 150), False),
+    "alzhaimer": (MODELS_DIR / "dementia_classifier.onnx", (128, 128), True),
+}
+
+
+class OnnxModel:
+    """An ONNX Runtime CPU session with full graph optimizations."""
+
+    def __init__(self, path):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = ORT_NUM_THREADS
+        self.session = ort.InferenceSession(
+            str(path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+def onnx_path(name, backend="onnx"):
+    """fp32 export, or its INT8 quantization (see quantize.py) for onnx_int8."""
+    path = ONNX_MODELS[name][0]
+    if backend == "onnx_int8":
+        return path.with_name(f"{path.stem}.int8.onnx")
+    return path
+
+
+for _name in ONNX_MODELS:
+    for _backend in ("onnx", "onnx_int8"):
+        registry.register(
+            f"{_name}_{_backend}", onnx_path(_name, _backend), OnnxModel, _backend
+        )
+
+
+def get_model(name, backend="onnx"):
+    return registry.get(f"{name}_{backend}")
+
+
+def preprocess_batch(name, image_datas):
+    _, size, grayscale = ONNX_MODELS[name]
+    batch, errors = decode_batch(image_datas, size, grayscale)
+    if grayscale:
+        batch = batch[:, np.newaxis]  # (n, 1, h, w), still the same buffer
+    return batch, errors
+
+
+def predict_images(name, image_datas, backend="onnx"):
+    """Decode and score encoded images; decode failures come back in place."""
+    with stage("decode", disease=name):
+        batch, errors = preprocess_batch(name, image_datas)
+    probs = []
+    if len(batch):
+        with stage("forward", disease=name, backend=backend):
+            probs = list(get_model(name, backend).run(batch))
+    return with_errors(errors, probs)
@@ -0,0 +1,190 @@
+"""
+Quantize the ONNX image models to INT8 and report the accuracy regression.
+
+Run from backend/ after `python -m preprocessing.export_onnx`:
+    python -m preprocessing.quantize
+    python -m preprocessing.quantize --models brain --calibration 64
+
+Static (QDQ) post-training quantization with ONNX Runtime: weights are INT8
+per channel, activations UINT8 with ranges calibrated on labelled samples.
+Calibration images are held out from the evaluation set. Brain samples come
+from data/braintumor-mri/Testing/<class>/; Alzheimer samples from
+--alzhaimer-dir (<Label_Name>/ folders) or else the Falah/Alzheimer_MRI test
+split on Hugging Face. The report (accuracy, agreement with fp32, max
+probability delta, latency, file size) is printed and written next to the
+model as <model>.int8.report.json.
+
+Serve the result with INFERENCE_BACKEND=onnx_int8 (or BRAIN_BACKEND /
+ALZHAIMER_BACKEND).
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+from .labels import ALZHAIMER_FOLDERS, BRAIN_FOLDERS
+from .onnx_backend import ONNX_MODELS, OnnxModel, onnx_path, preprocess_batch
+from .registry import MODELS_DIR
+
+BRAIN_DATA_DIR = MODELS_DIR.parent / "data" / "braintumor-mri" / "Testing"
+
+
+def folder_samples(directory, classes):
+    """(encoded image bytes, class id) pairs from <directory>/<class>/*."""
+    samples = []
+    for folder, class_id in classes.items():
+        for path in sorted(glob.glob(os.path.join(directory, folder, "*"))):
+            with open(path, "rb") as f:
+                samples.append((f.read(), class_id))
+    return samples
+
+
+def hub_alzhaimer_samples():
+    import io
+
+    from datasets import load_dataset
+
+    samples = []
+    for row in load_dataset("Falah/Alzheimer_MRI", split="test"):
+        encoded = io.BytesIO()
+        row["image"].save(encoded, format="PNG")
+        samples.append((encoded.getvalue(), int(row["label"])))
+    return samples
+
+
+def load_samples(name, alzhaimer_dir=None):
+    if name == "brain":
+        return folder_samples(BRAIN_DATA_DIR, BRAIN_FOLDERS)
+    if alzhaimer_dir:
+        return folder_samples(alzhaimer_dir, ALZHAIMER_FOLDERS)
+    return hub_alzhaimer_samples()
+
+
+def split_samples(samples, calibration, seed=0):
+    """A random calibration subset; everything else is used for evaluation."""
+    order = np.random.default_rng(seed).permutation(len(samples))
+    shuffled = [samples[i] for i in order]
+    return shuffled[:calibration], shuffled[calibration:]
+
+
+def to_batch(name, samples):
+    batch, errors = preprocess_batch(name, [data for data, _ in samples])
+    labels = np.array([label for (_, label), e in zip(samples, errors) if e is None])
+    return np.ascontiguousarray(batch), labels
+
+
+class BatchReader:
+    """CalibrationDataReader feeding the calibration set in small batches."""
+
+    def __init__(self, input_name, batch, batch_size=16):
+        self.inputs = iter(
+            {input_name: batch[i : i + batch_size]}
+            for i in range(0, len(batch), batch_size)
+        )
+
+    def get_next(self):
+        return next(self.inputs, None)
+
+
+def quantize(name, calibration_batch):
+    from onnxruntime.quantization import (
+        CalibrationMethod,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    fp32_path = onnx_path(name)
+    int8_path = onnx_path(name, "onnx_int8")
+    prepared = fp32_path.with_name(f"{fp32_path.stem}.prep.onnx")
+    quant_pre_process(str(fp32_path), str(prepared))
+    try:
+        input_name = OnnxModel(prepared).input_name
+        quantize_static(
+            str(prepared),
+            str(int8_path),
+            BatchReader(input_name, calibration_batch),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            weight_type=QuantType.QInt8,
+            activation_type=QuantType.QUInt8,
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+    finally:
+        os.remove(prepared)
+    return int8_path
+
+
+def run_batched(model, batch, batch_size=32):
+    return np.concatenate(
+        [model.run(batch[i : i + batch_size]) for i in range(0, len(batch), batch_size)]
+    )
+
+
+def latency_ms(model, batch, repeats=50):
+    """Median single-image latency."""
+    sample = batch[:1]
+    model.run(sample)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.run(sample)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def regression_report(name, eval_batch, labels):
+    fp32 = OnnxModel(onnx_path(name))
+    int8 = OnnxModel(onnx_path(name, "onnx_int8"))
+    fp32_probs = run_batched(fp32, eval_batch)
+    int8_probs = run_batched(int8, eval_batch)
+    fp32_pred = fp32_probs.argmax(axis=1)
+    int8_pred = int8_probs.argmax(axis=1)
+    return {
+        "model": name,
+        "eval_images": int(len(labels)),
+        "fp32_accuracy": float((fp32_pred == labels).mean()),
+        "int8_accuracy": float((int8_pred == labels).mean()),
+        "agreement": float((fp32_pred == int8_pred).mean()),
+        "max_probability_delta": float(np.abs(fp32_probs - int8_probs).max()),
+        "fp32_latency_ms": latency_ms(fp32, eval_batch),
+        "int8_latency_ms": latency_ms(int8, eval_batch),
+        "fp32_size_mb": os.path.getsize(onnx_path(name)) / 1024**2,
+        "int8_size_mb": os.path.getsize(onnx_path(name, "onnx_int8")) / 1024**2,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--models", nargs="+", choices=list(ONNX_MODELS), default=list(ONNX_MODELS)
+    )
+    parser.add_argument(
+        "--calibration", type=int, default=128, help="images held out for calibration"
+    )
+    parser.add_argument("--alzhaimer-dir", help="local <Label_Name>/ image folders")
+    parser.add_argument("--report-only", action="store_true", help="skip quantizing")
+    args = parser.parse_args()
+
+    for name in args.models:
+        samples = load_samples(name, args.alzhaimer_dir)
+        calibration, evaluation = split_samples(samples, args.calibration)
+        if not args.report_only:
+            calibration_batch, _ = to_batch(name, calibration)
+            print(f"quantized {name} -> {quantize(name, calibration_batch)}")
+
+        eval_batch, labels = to_batch(name, evaluation)
+        report = regression_report(name, eval_batch, labels)
+        report_path = onnx_path(name, "onnx_int8").with_suffix(".report.json")
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
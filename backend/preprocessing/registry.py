@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+# All serialized models live in backend/models
+MODELS_DIR = Path(__file__).resolve().parents[1] / "models"
+
+
+def _rss_bytes():
+    """Resident set size of the current process in bytes (0 if unknown)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class ModelEntry:
+    def __init__(self, name, path, loader, kind):
+        self.name = name
+        self.path = Path(path)
+        self.loader = loader
+        self.kind = kind
+        self.model = None
+        self.mtime = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.memory_bytes = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of deserialized models.
+
+    Each model is registered once with a loader taking the model path and is
+    loaded lazily on first use; concurrent first requests wait on a per-model
+    lock so the file is only deserialized once.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path, loader, kind="generic"):
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = ModelEntry(name, path, loader, kind)
+        return self._entries[name]
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def _entry(self, name):
+        try:
+            return self._entries[name]
+        except KeyError:
+            raise KeyError(f"Model '{name}' is not registered") from None
+
+    def _load(self, entry):
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        model = entry.loader(entry.path)
+        entry.load_seconds = time.perf_counter() - start
+        entry.memory_bytes = max(_rss_bytes() - rss_before, 0)
+        entry.mtime = _mtime(entry.path)
+        entry.loaded_at = time.time()
+        entry.model = model
+        print(f"loaded model {entry.name} in {entry.load_seconds:.2f}s")
+
+    def get(self, name):
+        entry = self._entry(name)
+        if entry.model is None:
+            with entry.lock:
+                if entry.model is None:
+                    self._load(entry)
+        return entry.model
+
+    def is_warm(self, name):
+        return self._entry(name).model is not None
+
+    def warmup(self, names=None):
+        for name in names or list(self._entries):
+            self.get(name)
+
+    def reload(self, name):
+        """Reload a model from disk; requests keep the old one until the swap."""
+        entry = self._entry(name)
+        with entry.lock:
+            self._load(entry)
+        return entry.model
+
+    def version(self, name):
+        """Identifies the model file on disk; changes whenever the file does."""
+        path = self._entry(name).path
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return "missing"
+        return f"{path.name}:{stat.st_size}:{int(stat.st_mtime)}"
+
+    def is_stale(self, name):
+        entry = self._entry(name)
+        return entry.model is not None and _mtime(entry.path) != entry.mtime
+
+    def reload_changed(self):
+        """Reload every warm model whose file changed since it was loaded."""
+        reloaded = [name for name in list(self._entries) if self.is_stale(name)]
+        for name in reloaded:
+            self.reload(name)
+        return reloaded
+
+    def status(self):
+        status = {}
+        for name, entry in self._entries.items():
+            status[name] = {
+                "kind": entry.kind,
+                "path": str(entry.path),
+                "warm": entry.model is not None,
+                "stale": self.is_stale(name),
+                "loaded_at": entry.loaded_at,
+                "load_seconds": entry.load_seconds,
+                "memory_mb": (
+                    round(entry.memory_bytes / (1024 * 1024), 2)
+                    if entry.memory_bytes is not None
+                    else None
+                ),
+            }
+        return status
+
+
+registry = ModelRegistry()
@@ -0,0 +1,141 @@
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+from opentelemetry import trace
+
+from .metrics import LATENCY_BUCKETS, histogram
+
+# Stages range from a millisecond decode to a minute-long LLM call
+STAGE_BUCKETS = LATENCY_BUCKETS + (5.0, 10.0, 30.0, 60.0)
+
+# A no-op until configure_tracing installs an SDK provider
+tracer = trace.get_tracer("drml")
+
+# Stage durations of the current request, for its Server-Timing header
+_timings = contextvars.ContextVar("server_timings", default=None)
+
+
+def configure_tracing(service_name):
+    """Export spans over OTLP when OTEL_EXPORTER_OTLP_ENDPOINT is set."""
+    if not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+        OTLPSpanExporter,
+    )
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    name = os.getenv("OTEL_SERVICE_NAME", service_name)
+    provider = TracerProvider(resource=Resource.create({"service.name": name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+
+
+def record_stage(name, seconds, **labels):
+    """Add a timed stage to stage_seconds and the request's Server-Timing."""
+    histogram(
+        "stage_seconds",
+        STAGE_BUCKETS,
+        "Time spent per pipeline stage",
+        {"stage": name, **labels},
+    ).observe(seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name, **labels):
+    """Time a block as pipeline stage `name`, inside a span of the same name."""
+    with tracer.start_as_current_span(name, attributes=labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record_stage(name, time.perf_counter() - start, **labels)
+
+
+@contextmanager
+def linked_span(name, span_contexts, **attributes):
+    """
+    A span for work shared by several requests (a micro-batch, a job), linked
+    to each request's span. Yields a copy of the context to run that work in
+    on another thread.
+    """
+    links = [trace.Link(context) for context in span_contexts if context.is_valid]
+    with tracer.start_as_current_span(name, links=links, attributes=attributes):
+        yield contextvars.copy_context()
+
+
+def current_span_context():
+    return trace.get_current_span().get_span_context()
+
+
+def create_background_task(loop, coro):
+    """
+    Start a long-lived worker task outside the current request, so it neither
+    inherits that request's span nor adds to its Server-Timing.
+    """
+    return contextvars.Context().run(loop.create_task, coro)
+
+
+def server_timing(timings, total):
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware wrapping each HTTP request in a server span, recording
+    http_request_seconds per method, route and status, and reporting the
+    stages timed so far in a Server-Timing header. Streaming responses only
+    report what ran before the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+        method = scope["method"]
+        with tracer.start_as_current_span(
+            f"{method} {scope['path']}", kind=trace.SpanKind.SERVER
+        ) as span:
+
+            async def send_with_timing(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    value = server_timing(timings, time.perf_counter() - start)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", value.encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                _timings.reset(token)
+                # FastAPI puts the matched route in the scope; use its template
+                # so /jobs/{job_id} is one series, not one per job
+                route = getattr(scope.get("route"), "path", "unmatched")
+                span.update_name(f"{method} {route}")
+                span.set_attribute("http.route", route)
+                span.set_attribute("http.status_code", status)
+                histogram(
+                    "http_request_seconds",
+                    STAGE_BUCKETS,
+                    "Time to the end of the response",
+                    {"method": method, "route": route, "status": str(status)},
+                ).observe(time.perf_counter() - start)
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from .tracing import stage
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, max_bytes):
+        super().__init__(f"Upload exceeds {max_bytes // (1024 * 1024)} MB limit")
+        self.max_bytes = max_bytes
+
+
+class Upload:
+    """
+    A received upload: its bytes as a memoryview over a single buffer, the
+    SHA-256 digest, and the spooled file on disk (if one was written).
+    """
+
+    def __init__(self, data, digest, path=None):
+        self.data = data
+        self.digest = digest
+        self.path = path
+
+    @property
+    def size(self):
+        return self.data.nbytes
+
+    def save(self, path):
+        """Move the spooled file to its final name."""
+        os.replace(self.path, path)
+        self.path = path
+        return path
+
+    def discard(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _Buffer:
+    """Upload bytes, preallocated when the size is known up front."""
+
+    def __init__(self, size_hint, max_bytes):
+        if size_hint is not None and size_hint > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        self.max_bytes = max_bytes
+        self.data = bytearray(size_hint or 0)
+        self.length = 0
+
+    def append(self, chunk):
+        end = self.length + len(chunk)
+        if end > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        if end <= len(self.data):
+            self.data[self.length : end] = chunk
+        else:
+            # Longer than the hint said, or no hint: grow
+            del self.data[self.length :]
+            self.data += chunk
+        self.length = end
+
+    def view(self):
+        return memoryview(self.data)[: self.length]
+
+
+def read_upload(
+    fileobj,
+    size_hint=None,
+    spool_dir=None,
+    max_bytes=MAX_UPLOAD_BYTES,
+    chunk_size=UPLOAD_CHUNK_BYTES,
+):
+    """
+    Blocking: read `fileobj` in chunks, hashing and size-checking as it goes.
+
+    With `spool_dir`, chunks are also written to a temporary file there by
+    the writer thread; call `Upload.save` or `Upload.discard` afterwards.
+    """
+    with stage("upload"):
+        buffer = _Buffer(size_hint, max_bytes)
+        hasher = hashlib.sha256()
+        if spool_dir is None:
+            while chunk := fileobj.read(chunk_size):
+                buffer.append(chunk)
+                hasher.update(chunk)
+            return Upload(buffer.view(), hasher.hexdigest())
+
+        spool = tempfile.NamedTemporaryFile(dir=spool_dir, suffix=".part", delete=False)
+        pending = []  # chunk writes not yet checked, oldest first
+        # Disk writes overlap with reading and hashing the next chunk. Each
+        # upload has its own writer thread, which keeps its chunks in order
+        # without queueing behind other uploads
+        with ThreadPoolExecutor(1, thread_name_prefix="upload-writer") as writer:
+            try:
+                while chunk := fileobj.read(chunk_size):
+                    buffer.append(chunk)
+                    hasher.update(chunk)
+                    pending.append(writer.submit(spool.write, chunk))
+                    # Stop at the first failed write (ENOSPC, EIO) rather
+                    # than keep a file with a hole in it
+                    while pending and pending[0].done():
+                        pending.pop(0).result()
+                for write in pending:
+                    write.result()
+            except BaseException:
+                for write in pending:
+                    write.cancel()
+                writer.submit(spool.close).result()
+                os.remove(spool.name)
+                raise
+        spool.close()
+        return Upload(buffer.view(), hasher.hexdigest(), spool.name)
+
+
+async def read_upload_async(
+    upload, max_bytes=MAX_UPLOAD_BYTES, chunk_size=UPLOAD_CHUNK_BYTES
+):
+    """read_upload for a Starlette UploadFile, without touching disk."""
+    with stage("upload"):
+        buffer = _Buffer(upload.size, max_bytes)
+        hasher = hashlib.sha256()
+        while chunk := await upload.read(chunk_size):
+            buffer.append(chunk)
+            hasher.update(chunk)
+        return Upload(buffer.view(), hasher.hexdigest())
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware answering 413 for request bodies over the limit: before
+    the body is read when Content-Length already says so, otherwise as soon
+    as the bytes received pass it (chunked or mislabelled requests).
+    """
+
+    def __init__(self, app, max_bytes=MAX_UPLOAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+        # Allowance for the multipart framing and form fields around the file
+        self.max_body = max_bytes + 64 * 1024
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_body:
+            await self.reject(send)
+            return
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def counting_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # Stop the app reading any further
+                    exceeded = True
+                    raise UploadTooLarge(self.max_bytes)
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if exceeded and not started:
+                # The app's answer to the cut-off body (a 400 from form
+                # parsing, or a 500): the 413 goes out instead
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not started:
+            await self.reject(send)
+
+    async def reject(self, send):
+        body = json.dumps({"detail": str(UploadTooLarge(self.max_bytes))})
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": body.encode()})
@@ -1,71 +1,57 @@
-import torch
-import torch.nn as nn
-from torchvision import models
-import cv2
-import numpy as np
+import os
 from pathlib import Path
 from dotenv import load_dotenv
 
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
 from chat.agents.alzhaimer.agent import report_agent
+from report.llm import run_agent, stream_report
+from report.sessions import SessionManager
+from preprocessing.inference import image_predictor, model_name
+from preprocessing.labels import ALZHAIMER_LABELS
+from preprocessing.tracing import stage
+from preprocessing.batching import MicroBatcher
+from preprocessing.cache import content_hash, prediction_cache
 
 env_path = Path(__file__).resolve().parents[1] / ".env"
 load_dotenv(dotenv_path=env_path)
 
-MODEL_PATH = Path(__file__).resolve().parents[1] / "models" / "dementia_classifier.pth"
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 APP_NAME = "alzhaimer_report"
 USER_ID = "report_user"
-SESSION_ID = "alzhaimer_report_session"
+BATCH_SIZE = int(os.getenv("ALZHAIMER_BATCH_SIZE", "32"))
+BATCH_WAIT_MS = float(os.getenv("ALZHAIMER_BATCH_WAIT_MS", "10"))
 
-session_service = InMemorySessionService()
+MODEL_NAME = model_name("alzhaimer")  # native PyTorch or ONNX
+sessions = SessionManager(APP_NAME)
 
-label_mapping = {
-    0: "Mild Dementia",
-    1: "Moderate Dementia",
-    2: "No Dementia",
-    3: "Very Mild Dementia",
-}
+label_mapping = ALZHAIMER_LABELS
 
 
-def load_model():
-    model = models.resnet18(pretrained=False)
-    model.conv1 = nn.Conv2d(1, 64, kernel_size=7, stride=2, padding=3, bias=False)
-    model.fc = nn.Linear(model.fc.in_features, 4)
-    model.load_state_dict(torch.load(MODEL_PATH, map_location=DEVICE))
-    model.eval()
-    return model.to(DEVICE)
+# Concurrent uploads share one batched forward pass, decoded on the batcher
+# thread into a single (n, 1, 128, 128) buffer
+alzhaimer_batcher = MicroBatcher(
+    "alzhaimer",
+    image_predictor("alzhaimer"),
+    max_batch_size=BATCH_SIZE,
+    max_wait_ms=BATCH_WAIT_MS,
+)
 
 
-model = load_model()
+async def predict(image_bytes, digest=None):
+    digest = digest or content_hash(image_bytes)
+    result = prediction_cache.lookup(MODEL_NAME, digest)
+    if result is None:
+        # Queueing, decode and forward pass as seen by this request
+        with stage("inference", disease="alzhaimer"):
+            prob = await alzhaimer_batcher.submit(image_bytes)
+        result = prediction_cache.save(MODEL_NAME, digest, prob)
 
-
-def preprocess_image(image_bytes):
-    file_bytes = np.asarray(bytearray(image_bytes), dtype=np.uint8)
-    img = cv2.imdecode(file_bytes, cv2.IMREAD_GRAYSCALE)
-    img_resized = cv2.resize(img, (128, 128))
-    img_normalized = img_resized.astype(np.float32) / 255.0
-    img_tensor = torch.from_numpy(img_normalized).unsqueeze(0).unsqueeze(0)
-    return img_tensor.to(DEVICE)
-
-
-def predict(image_bytes):
-    input_tensor = preprocess_image(image_bytes)
-    with torch.no_grad():
-        output = model(input_tensor)
-        _, pred = torch.max(output, 1)
-        prob = torch.softmax(output, dim=1).squeeze().cpu().numpy()
-    class_id = int(pred.item())
+    class_id = result["class_id"]
     label = label_mapping[class_id]
-    confidence = float(prob[class_id])
-    print("label and condidence of alzhaimer:", label, confidence)
+    confidence = result["probabilities"][class_id]
     return label, confidence
 
 
-async def generate_alzhaimer_report(image_file_bytes, patient_data):
-    label, confidence = predict(image_file_bytes)
+async def build_alzhaimer_query(image_file_bytes, patient_data, digest=None):
+    label, confidence = await predict(image_file_bytes, digest)
 
     name = patient_data.get("patient_name", "The patient")
     age = patient_data.get("age", "unknown")
@@ -98,23 +84,20 @@ async def generate_alzhaimer_report(image_file_bytes, patient_data):
     if details:
         query += " Additionally, " + ", ".join(details) + "."
 
-    # Create session
-    await session_service.create_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
+    return {"label": label, "confidence": confidence}, query
 
-    runner = Runner(
-        agent=report_agent, app_name=APP_NAME, session_service=session_service
-    )
-    content = types.Content(role="user", parts=[types.Part(text=query)])
 
-    # ✅ FIXED: use regular `for` because `runner.run()` is a normal generator
-    for _ in runner.run(user_id=USER_ID, session_id=SESSION_ID, new_message=content):
-        pass
+async def generate_alzhaimer_report(image_file_bytes, patient_data, digest=None):
+    _, query = await build_alzhaimer_query(image_file_bytes, patient_data, digest)
+
+    # Create a one-shot session
+    async with sessions.session(USER_ID) as session_id:
+        state = await run_agent(
+            report_agent, APP_NAME, sessions.session_service, USER_ID, session_id, query
+        )
+
+    return state.get("alzhaimer_report_response", "No response found.")
 
-    session = await session_service.get_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
 
-    print("alzhaimer session state:", session.state.get("alzhaimer_report_response"))
-    return session.state.get("alzhaimer_report_response", "No response found.")
+def stream_alzhaimer_report(prediction, query):
+    return stream_report(report_agent, sessions, USER_ID, prediction, query)
@@ -1,53 +1,55 @@
-import numpy as np
-import cv2
-from PIL import Image
 import os
-from tensorflow.keras.models import load_model as keras_load_model
 
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
 from chat.agents.brain.agent import report_agent
+from report.llm import run_agent, stream_report
+from report.sessions import SessionManager
+from preprocessing.batching import MicroBatcher
+from preprocessing.cache import content_hash, prediction_cache
+from preprocessing.inference import image_predictor, model_name
+from preprocessing.labels import BRAIN_LABELS
+from preprocessing.tracing import stage
 
 # Constants
 APP_NAME = "brain_report"
 USER_ID = "report_user"
-SESSION_ID = "brain_report_session"
-session_service = InMemorySessionService()
+BATCH_SIZE = int(os.getenv("BRAIN_BATCH_SIZE", "32"))
+BATCH_WAIT_MS = float(os.getenv("BRAIN_BATCH_WAIT_MS", "10"))
+MODEL_NAME = model_name("brain")  # native Keras or ONNX, per INFERENCE_BACKEND
+sessions = SessionManager(APP_NAME)
 
 # Label mapping
-label_mapping = {
-    0: "Glioma Tumor",
-    1: "No Tumor",
-    2: "Meningioma Tumor",
-    3: "Pituitary Tumor",
-}
+label_mapping = BRAIN_LABELS
 
 
-def load_model():
-    model_path = os.path.join(os.path.dirname(__file__), "..", "models", "brain.h5")
-    return keras_load_model(os.path.abspath(model_path))
+# Concurrent requests share one batched model.predict call; images are
+# decoded on the batcher thread straight into the batch buffer
+brain_batcher = MicroBatcher(
+    "brain",
+    image_predictor("brain"),
+    max_batch_size=BATCH_SIZE,
+    max_wait_ms=BATCH_WAIT_MS,
+)
 
 
-def preprocess_image(uploaded_file):
-    image = Image.open(uploaded_file).convert("RGB")
-    img_array = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-    resized = cv2.resize(img_array, (150, 150))
-    normalized = resized / 255.0
-    return np.expand_dims(normalized, axis=0)
+async def predict(uploaded_file):
+    image_bytes = uploaded_file.read()
+    digest = content_hash(image_bytes)
 
+    # Byte-identical images skip decoding and inference
+    result = prediction_cache.lookup(MODEL_NAME, digest)
+    if result is None:
+        # Queueing, decode and forward pass as seen by this request
+        with stage("inference", disease="brain"):
+            probs = await brain_batcher.submit(image_bytes)
+        result = prediction_cache.save(MODEL_NAME, digest, probs)
 
-def predict(uploaded_file, model):
-    img_tensor = preprocess_image(uploaded_file)
-    probs = model.predict(img_tensor)[0]
-    pred_index = int(np.argmax(probs))
+    pred_index = result["class_id"]
     pred_label = label_mapping[pred_index]
-    return pred_label, float(probs[pred_index])
+    return pred_label, result["probabilities"][pred_index]
 
 
-async def generate_brain_report(image_file, patient_data):
-    model = load_model()
-    label, confidence = predict(image_file, model)
+async def build_brain_query(image_file, patient_data):
+    label, confidence = await predict(image_file)
 
     name = patient_data.get("patientName", "The patient")
     age = patient_data.get("age", "unknown")
@@ -79,23 +81,20 @@ async def generate_brain_report(image_file, patient_data):
     if details:
         query += " Additionally, " + ", ".join(details) + "."
 
-    # Create session
-    await session_service.create_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
+    return {"label": label, "confidence": confidence}, query
 
-    runner = Runner(
-        agent=report_agent, app_name=APP_NAME, session_service=session_service
-    )
-    content = types.Content(role="user", parts=[types.Part(text=query)])
 
-    # ✅ FIXED: use regular `for` because `runner.run()` is a normal generator
-    for _ in runner.run(user_id=USER_ID, session_id=SESSION_ID, new_message=content):
-        pass
+async def generate_brain_report(image_file, patient_data):
+    _, query = await build_brain_query(image_file, patient_data)
+
+    # Create a one-shot session
+    async with sessions.session(USER_ID) as session_id:
+        state = await run_agent(
+            report_agent, APP_NAME, sessions.session_service, USER_ID, session_id, query
+        )
+
+    return state.get("brain_report_response", "No response found.")
 
-    session = await session_service.get_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
 
-    print("brain session state:", session.state.get("brain_report_response"))
-    return session.state.get("brain_report_response", "No response found.")
+def stream_brain_report(prediction, query):
+    return stream_report(report_agent, sessions, USER_ID, prediction, query)
@@ -1,10 +1,15 @@
 import asyncio
-from google.adk.sessions import InMemorySessionService
-from google.adk.runners import Runner
-from google.genai import types
+import os
+from typing import Optional
+
+from preprocessing.metrics import counter
+from report.llm import run_agent
+from report.response_cache import ResponseCache
+from report.sessions import SessionManager, UnknownSession
 
 # Agent imports
 from chat.agents.classify.agent import root_agent as classify_bot
+from chat.agents.classify.local import get_local_classifier, log_example
 from chat.agents.alzhaimer.agent import root_agent as alzhaimer_bot
 from chat.agents.brain.agent import root_agent as brain_bot
 from chat.agents.heart.agent import root_agent as heart_bot
@@ -14,11 +19,23 @@ from chat.agents.general.agent import root_agent as general_bot
 # Constants
 APP_NAME = "drml_chatbot"
 USER_ID = "user_ui"
-CLASSIFY_SESSION = "ui_classify_session"
-SPECIALIST_SESSION = "ui_specialist_session"
+
+# Speculative routing: when a query needs the LLM classifier, the most likely
+# specialists (per the local classifier) start answering at the same time and
+# the one matching the final label is kept. At most CHATBOT_SPECULATIVE_CALLS
+# extra specialist calls per query (0 disables), and only for labels the local
+# model gives at least CHATBOT_SPECULATE_MIN_PROB.
+SPECULATIVE_CALLS = int(os.getenv("CHATBOT_SPECULATIVE_CALLS", "0"))
+SPECULATE_MIN_PROB = float(os.getenv("CHATBOT_SPECULATE_MIN_PROB", "0.15"))
+
+# Trained here, while the module is imported off the event loop
+local_classifier = get_local_classifier()
 
 # Session manager
-session_service = InMemorySessionService()
+sessions = SessionManager(APP_NAME)
+
+# Answers to repeated (FAQ-style) queries, per agent
+response_cache = ResponseCache()
 
 # Agent label → (agent, session_state_key) mapping
 BOT_MAPPING = {
@@ -30,56 +47,125 @@ BOT_MAPPING = {
 }
 
 
-async def classify_query(query: str) -> str:
-    await session_service.create_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=CLASSIFY_SESSION
-    )
+async def quick_label(query: str) -> Optional[str]:
+    """The label from the cache or a confident local match, else None."""
+    cached = await response_cache.get(classify_bot, query)
+    if cached is not None:
+        return cached
 
-    runner = Runner(
-        agent=classify_bot, app_name=APP_NAME, session_service=session_service
-    )
-    content = types.Content(role="user", parts=[types.Part(text=query)])
+    # Confident keyword/model matches skip the LLM round trip
+    label = local_classifier.classify(query)
+    if label is not None:
+        counter("classify_local_answers", "Queries classified locally").inc()
+    return label
 
-    for _ in runner.run(
-        user_id=USER_ID, session_id=CLASSIFY_SESSION, new_message=content
-    ):
-        pass
 
-    session = await session_service.get_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=CLASSIFY_SESSION
-    )
-    disease_class = session.state.get("disease_class", "general")
+async def llm_label(query: str) -> str:
+    counter("classify_llm_fallbacks", "Queries classified by the LLM").inc()
+
+    # Classification is stateless: a fresh session per query
+    async with sessions.session(USER_ID) as session_id:
+        state = await run_agent(
+            classify_bot, APP_NAME, sessions.session_service, USER_ID, session_id, query
+        )
+    disease_class = state.get("disease_class", "general")
 
-    print("classification result:", disease_class)
+    if "disease_class" in state:
+        await response_cache.put(classify_bot, query, disease_class)
+        # A file append; keep it off the event loop
+        await asyncio.to_thread(log_example, query, disease_class)
     return disease_class
 
 
-async def get_bot_response(label: str, query: str) -> str:
-    await session_service.create_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=SPECIALIST_SESSION
-    )
+async def classify_query(query: str) -> str:
+    label = await quick_label(query)
+    if label is None:
+        label = await llm_label(query)
+    return label
 
+
+async def get_bot_response(
+    label: str, query: str, conversation_id: Optional[str] = None
+) -> str:
     agent, state_key = BOT_MAPPING.get(label, (general_bot, "general_bot_response"))
-    runner = Runner(agent=agent, app_name=APP_NAME, session_service=session_service)
-    content = types.Content(role="user", parts=[types.Part(text=query)])
 
-    for _ in runner.run(
-        user_id=USER_ID, session_id=SPECIALIST_SESSION, new_message=content
-    ):
-        pass
+    # Answers inside a conversation depend on its history, so only one-shot
+    # questions are cached
+    if conversation_id is None:
+        cached = await response_cache.get(agent, query)
+        if cached is not None:
+            return cached
+
+    # Specialists keep history within a conversation, otherwise one-shot
+    async with sessions.session(USER_ID, conversation_id) as session_id:
+        state = await run_agent(
+            agent, APP_NAME, sessions.session_service, USER_ID, session_id, query
+        )
+    response = state.get(state_key, "I'm sorry, I couldn't generate a response.")
+
+    if conversation_id is None and state_key in state:
+        await response_cache.put(agent, query, response)
+    return response
 
-    session = await session_service.get_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=SPECIALIST_SESSION
-    )
-    response = session.state.get(
-        state_key, "I'm sorry, I couldn't generate a response."
-    )
 
-    print(f"{label} session state:", response)
-    return response
+def speculative_labels(query: str) -> list:
+    ranked = local_classifier.rank(query)[:SPECULATIVE_CALLS]
+    return [label for label, proba in ranked if proba >= SPECULATE_MIN_PROB]
 
 
-async def get_chatbot_response(query: str) -> str:
+async def cancel_all(tasks):
+    for task in tasks:
+        task.cancel()
+    # Collect results so failed guesses are not reported as unretrieved
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def speculative_response(query: str) -> str:
+    """One-shot answer with the LLM classifier and likely specialists overlapped."""
+    label = await quick_label(query)
+    if label is not None:
+        return await get_bot_response(label, query)
+
+    speculative = {
+        guess: asyncio.create_task(get_bot_response(guess, query))
+        for guess in speculative_labels(query)
+    }
+    counter("chatbot_speculative_calls", "Specialist calls started early").inc(
+        len(speculative)
+    )
+    try:
+        label = await llm_label(query)
+    except BaseException:
+        await cancel_all(speculative.values())
+        raise
+    if label not in BOT_MAPPING:
+        label = "general"
+
+    match = speculative.pop(label, None)
+    await cancel_all(speculative.values())
+    counter("chatbot_speculative_cancelled", "Early calls for the wrong label").inc(
+        len(speculative)
+    )
+    if match is not None:
+        counter("chatbot_speculation_hits", "Answers started before the label").inc()
+        return await match
+    if speculative:
+        counter("chatbot_speculation_misses", "Queries where no guess matched").inc()
+    return await get_bot_response(label, query)
+
+
+async def start_conversation() -> str:
+    """A new conversation id; pass it back with every later turn."""
+    return await sessions.start(USER_ID)
+
+
+async def get_chatbot_response(
+    query: str, conversation_id: Optional[str] = None
+) -> str:
+    # A guess at the wrong specialist would leave its turn in the
+    # conversation's history, so only one-shot questions are speculated on
+    if SPECULATIVE_CALLS > 0 and conversation_id is None:
+        return await speculative_response(query)
     label = await classify_query(query)
-    response = await get_bot_response(label, query)
+    response = await get_bot_response(label, query, conversation_id)
     return response
@@ -1,50 +1,25 @@
-import joblib
-import pandas as pd
-from pathlib import Path
-
 from chat.agents.heart.agent import report_agent
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
+from report.llm import run_agent, stream_report
+from report.sessions import SessionManager
+from preprocessing.heart import load_model, prepare_input
+from preprocessing.tracing import stage
 
 # Constants
-MODEL_PATH = Path("backend/models/best_svm_model.pkl")
-FEATURES_PATH = Path("backend/models/svm_model_features.pkl")
 APP_NAME = "heart_report"
 USER_ID = "report_user"
-SESSION_ID = "heart_report_session"
-
-session_service = InMemorySessionService()
-
-
-def load_model():
-    return joblib.load(MODEL_PATH)
-
-
-def get_model_features():
-    return joblib.load(FEATURES_PATH)
-
-
-def prepare_input(user_input: dict):
-    input_df = pd.DataFrame([user_input])
-    input_df = pd.get_dummies(
-        input_df, columns=["cp", "restecg", "thal"], drop_first=True
-    )
 
-    model_columns = get_model_features()
-    for col in model_columns:
-        if col not in input_df.columns:
-            input_df[col] = 0
+sessions = SessionManager(APP_NAME)
 
-    return input_df[model_columns]
 
-
-async def generate_heart_report(formData: dict, additionalInfo: dict):
+def build_heart_query(formData: dict, additionalInfo: dict):
+    """Run the model and compose the report prompt -> (prediction, query)."""
     model = load_model()
-    input_df = prepare_input(formData)
+    with stage("preprocess", disease="heart"):
+        features = prepare_input(formData)
 
-    prediction = model.predict(input_df)[0]
-    confidence = max(model.predict_proba(input_df)[0])
+    with stage("forward", disease="heart", backend="native"):
+        prediction = model.predict(features)[0]
+        confidence = max(model.predict_proba(features)[0])
 
     has_disease = prediction == 1
     diagnosis = "has heart disease" if has_disease else "does not have heart disease"
@@ -85,23 +60,20 @@ async def generate_heart_report(formData: dict, additionalInfo: dict):
             + "."
         )
 
-    # Create session
-    await session_service.create_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
+    return {"has_disease": bool(has_disease), "confidence": float(confidence)}, query
 
-    runner = Runner(
-        agent=report_agent, app_name=APP_NAME, session_service=session_service
-    )
-    content = types.Content(role="user", parts=[types.Part(text=query)])
 
-    # ✅ FIXED: use regular `for` because `runner.run()` is a normal generator
-    for _ in runner.run(user_id=USER_ID, session_id=SESSION_ID, new_message=content):
-        pass
+async def generate_heart_report(formData: dict, additionalInfo: dict):
+    _, query = build_heart_query(formData, additionalInfo)
+
+    # Create a one-shot session
+    async with sessions.session(USER_ID) as session_id:
+        state = await run_agent(
+            report_agent, APP_NAME, sessions.session_service, USER_ID, session_id, query
+        )
+
+    return state.get("heart_report_response", "No response found.")
 
-    session = await session_service.get_session(
-        app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID
-    )
 
-    print("heart session state:", session.state.get("heart_report_response"))
-    return session.state.get("heart_report_response", "No response found.")
+def stream_heart_report(prediction, query):
+    return stream_report(report_agent, sessions, USER_ID, prediction, query)
@@ -0,0 +1,329 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import JSON, Column, DateTime, String, Text, create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.sql import func
+
+from preprocessing.metrics import counter, gauge, histogram
+from preprocessing.tracing import (
+    create_background_task,
+    current_span_context,
+    linked_span,
+)
+
+# Any SQLAlchemy URL; the default keeps local runs self-contained
+JOBS_DATABASE_URL = os.getenv("JOBS_DATABASE_URL", "sqlite:///./jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Accepted but unfinished jobs per process; submits beyond this are refused
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))
+# Payload bytes (uploaded images) held by those jobs; also refused beyond this
+JOB_MAX_PENDING_BYTES = int(os.getenv("JOB_MAX_PENDING_BYTES", str(256 * 1024 * 1024)))
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "300"))
+# Longest a GET /jobs/{id}?wait= request is held open
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", "30"))
+JOB_POLL_INTERVAL_SECONDS = 0.5
+JOB_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+Base = declarative_base()
+
+
+class Job(Base):
+    __tablename__ = "report_jobs"
+
+    id = Column(String(32), primary_key=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default=QUEUED, index=True)
+    result = Column(JSON)
+    error = Column(Text)
+    # host:pid of the process holding the payload, see JobStore.recover
+    owner = Column(String, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+
+class JobQueueFull(Exception):
+    """
+    Raised by `JobQueue.submit` when JOB_MAX_PENDING jobs are unfinished, or
+    their payloads already hold JOB_MAX_PENDING_BYTES.
+    """
+
+
+class JobStore:
+    """Job rows in their own database; every method is blocking."""
+
+    def __init__(self, url=JOBS_DATABASE_URL):
+        connect_args = {}
+        if make_url(url).get_backend_name() == "sqlite":
+            connect_args["check_same_thread"] = False
+        self.engine = create_engine(url, connect_args=connect_args)
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+
+    def create(self, job_id, kind, owner):
+        with self.Session() as db:
+            db.add(Job(id=job_id, kind=kind, status=QUEUED, owner=owner))
+            db.commit()
+
+    def update(self, job_id, **fields):
+        with self.Session() as db:
+            db.query(Job).filter(Job.id == job_id).update(fields)
+            db.commit()
+
+    def get(self, job_id):
+        with self.Session() as db:
+            job = db.get(Job, job_id)
+            if job is None:
+                return None
+            return {
+                "id": job.id,
+                "kind": job.kind,
+                "status": job.status,
+                "result": job.result,
+                "error": job.error,
+                "created_at": _iso(job.created_at),
+                "started_at": _iso(job.started_at),
+                "finished_at": _iso(job.finished_at),
+            }
+
+    def recover(self, owner):
+        """
+        Fail unfinished jobs left by dead processes on this host. Payloads
+        only live in the memory of the process that accepted them, so those
+        jobs can never run. `owner` is the calling process, which has not
+        accepted anything yet (containers restart with the same pid).
+        Returns how many were failed.
+        """
+        host = owner.rsplit(":", 1)[0]
+        with self.Session() as db:
+            jobs = (
+                db.query(Job)
+                .filter(Job.status.in_((QUEUED, RUNNING)))
+                .filter(Job.owner.like(f"{host}:%"))
+                .all()
+            )
+            dead = [
+                job
+                for job in jobs
+                if job.owner == owner or not _alive(int(job.owner.rsplit(":", 1)[1]))
+            ]
+            for job in dead:
+                job.status = FAILED
+                job.error = "Interrupted by a server restart"
+                job.finished_at = _now()
+            db.commit()
+            return len(dead)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Runs report jobs on a bounded pool of asyncio workers in this process.
+
+    `handlers` maps a job kind to a coroutine function taking the submitted
+    payload and returning a JSON-serializable result. Submitting stores a
+    queued row and returns its id at once; workers record the result or
+    error when the handler finishes. Payloads stay in memory until then, so
+    both the number of unfinished jobs and the bytes they hold are bounded.
+    `wait` long-polls a job: in the process that ran it, it wakes as soon as
+    the job finishes, elsewhere it polls the table.
+    """
+
+    def __init__(
+        self,
+        handlers,
+        store=None,
+        workers=JOB_WORKERS,
+        max_pending=JOB_MAX_PENDING,
+        max_pending_bytes=JOB_MAX_PENDING_BYTES,
+        timeout=JOB_TIMEOUT_SECONDS,
+    ):
+        self.handlers = handlers
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_pending_bytes = max_pending_bytes
+        self.timeout = timeout
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+        self._done = {}  # job id -> asyncio.Event, while the job is unfinished
+        self._sizes = {}  # job id -> payload bytes, while the job is unfinished
+        self.pending_bytes = 0
+        self.submitted = counter("jobs_submitted", "Report jobs accepted")
+        self.rejected = counter("jobs_rejected", "Submits refused, queue full")
+        self.failed = counter("jobs_failed", "Report jobs that raised or timed out")
+        self.queue_wait_hist = histogram(
+            "job_queue_wait_seconds", JOB_BUCKETS, "Time from submit to job start"
+        )
+        self.run_hist = histogram(
+            "job_run_seconds", JOB_BUCKETS, "Time to run a report job"
+        )
+        gauge("jobs_pending", lambda: len(self._done), "Unfinished jobs")
+        gauge(
+            "jobs_pending_bytes",
+            lambda: self.pending_bytes,
+            "Payload bytes held by unfinished jobs",
+        )
+
+    async def start(self):
+        if self.store is None:
+            self.store = await asyncio.to_thread(JobStore)
+        recovered = await asyncio.to_thread(self.store.recover, self.owner)
+        if recovered:
+            print(f"failed {recovered} jobs interrupted by a restart")
+        self._ensure_workers()
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._tasks = []
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(create_background_task(loop, self._run()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind, payload, size=0):
+        """Queue a job; `size` is the payload's memory footprint in bytes."""
+        if self.store is None:
+            raise RuntimeError("JobQueue.start() has not run")
+        if kind not in self.handlers:
+            raise KeyError(f"Unknown job kind '{kind}'")
+        if len(self._done) >= self.max_pending:
+            self.rejected.inc()
+            raise JobQueueFull(f"{len(self._done)} report jobs are already pending")
+        if self.pending_bytes + size > self.max_pending_bytes:
+            self.rejected.inc()
+            raise JobQueueFull(
+                f"Pending report jobs already hold {self.pending_bytes} bytes"
+            )
+        self._ensure_workers()
+
+        job_id = uuid.uuid4().hex
+        # Reserve the slot before yielding to the event loop
+        self._done[job_id] = asyncio.Event()
+        self._reserve(job_id, size)
+        try:
+            await asyncio.to_thread(self.store.create, job_id, kind, self.owner)
+        except Exception:
+            del self._done[job_id]
+            self._unreserve(job_id)
+            raise
+        self._queue.put_nowait(
+            (job_id, kind, payload, time.perf_counter(), current_span_context())
+        )
+        self.submitted.inc()
+        return job_id
+
+    async def _run(self):
+        while True:
+            job_id, kind, payload, enqueued, submitted_by = await self._queue.get()
+            try:
+                # Traced on its own, linked to the request that submitted it
+                with linked_span(f"job {kind}", [submitted_by], job_id=job_id):
+                    await self._execute(job_id, kind, payload, enqueued)
+            finally:
+                # Don't hold the image while waiting for the next job
+                del payload
+                self._unreserve(job_id)
+                self._done.pop(job_id).set()
+
+    def _reserve(self, job_id, size):
+        self._sizes[job_id] = size
+        self.pending_bytes += size
+
+    def _unreserve(self, job_id):
+        self.pending_bytes -= self._sizes.pop(job_id)
+
+    async def _execute(self, job_id, kind, payload, enqueued):
+        started = time.perf_counter()
+        self.queue_wait_hist.observe(started - enqueued)
+        try:
+            await asyncio.to_thread(
+                self.store.update, job_id, status=RUNNING, started_at=_now()
+            )
+            result = await asyncio.wait_for(self.handlers[kind](payload), self.timeout)
+            fields = {"status": SUCCEEDED, "result": result}
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self.failed.inc()
+            fields = {"status": FAILED, "error": f"Timed out after {self.timeout}s"}
+        except Exception as e:
+            self.failed.inc()
+            print(f"job {job_id} ({kind}) failed: {e}")
+            fields = {"status": FAILED, "error": str(e)}
+        finally:
+            self.run_hist.observe(time.perf_counter() - started)
+
+        try:
+            await asyncio.to_thread(
+                self.store.update, job_id, finished_at=_now(), **fields
+            )
+        except Exception as e:
+            # e.g. a result that is not JSON-serializable
+            print(f"job {job_id} ({kind}) could not be saved: {e}")
+            await asyncio.to_thread(
+                self.store.update,
+                job_id,
+                status=FAILED,
+                error=f"Could not save result: {e}",
+                finished_at=_now(),
+            )
+
+    async def wait(self, job_id, timeout=0.0):
+        """The job's current row after it finishes or `timeout` seconds pass."""
+        # Taken before reading the row, so a finish in between still wakes us
+        done = self._done.get(job_id)
+        # Also turns a NaN or negative timeout into no wait at all
+        timeout = min(timeout, JOB_MAX_WAIT_SECONDS) if timeout > 0 else 0.0
+        deadline = time.monotonic() + timeout
+        job = await asyncio.to_thread(self.store.get, job_id)
+        while job is not None and job["status"] not in FINISHED:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if done is not None:
+                try:
+                    await asyncio.wait_for(done.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                # Accepted by another worker process
+                await asyncio.sleep(min(JOB_POLL_INTERVAL_SECONDS, remaining))
+            job = await asyncio.to_thread(self.store.get, job_id)
+        return job
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import time
+
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.runners import Runner
+from google.genai import types
+
+from preprocessing.metrics import histogram
+from preprocessing.tracing import record_stage, tracer
+
+# Default number of in-flight LLM calls per agent; override per agent with
+# LLM_MAX_CONCURRENCY_<AGENT_NAME>, e.g. LLM_MAX_CONCURRENCY_HEART_REPORT_AGENT
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+_runners = {}
+_semaphores = {}
+
+
+def get_runner(agent, app_name, session_service):
+    key = (agent.name, app_name, id(session_service))
+    if key not in _runners:
+        _runners[key] = Runner(
+            agent=agent, app_name=app_name, session_service=session_service
+        )
+    return _runners[key]
+
+
+def get_semaphore(agent):
+    if agent.name not in _semaphores:
+        limit = os.getenv(f"LLM_MAX_CONCURRENCY_{agent.name.upper()}")
+        _semaphores[agent.name] = asyncio.Semaphore(
+            int(limit) if limit else LLM_MAX_CONCURRENCY
+        )
+    return _semaphores[agent.name]
+
+
+async def _agent_events(
+    agent, app_name, session_service, user_id, session_id, query, run_config=None
+):
+    runner = get_runner(agent, app_name, session_service)
+    content = types.Content(role="user", parts=[types.Part(text=query)])
+    llm_seconds = histogram(
+        "llm_seconds",
+        LLM_BUCKETS,
+        "LLM round trip per agent turn",
+        {"agent": agent.name},
+    )
+
+    waited = time.perf_counter()
+    async with get_semaphore(agent):
+        start = time.perf_counter()
+        record_stage("llm_wait", start - waited, agent=agent.name)
+        # Not made the current span: this generator yields to its consumer
+        # while the span is open, which would leak it into the caller
+        span = tracer.start_span("llm", attributes={"agent": agent.name})
+        try:
+            async for event in runner.run_async(
+                user_id=user_id,
+                session_id=session_id,
+                new_message=content,
+                run_config=run_config or RunConfig(),
+            ):
+                yield event
+        finally:
+            span.end()
+            elapsed = time.perf_counter() - start
+            llm_seconds.observe(elapsed)
+            record_stage("llm", elapsed, agent=agent.name)
+
+
+async def run_agent(agent, app_name, session_service, user_id, session_id, query):
+    """
+    Runs one agent turn through the Runner's async event stream, so the event
+    loop keeps serving other requests during the LLM round trip, and returns
+    the session state the agent wrote its `output_key` into.
+    """
+    async for _ in _agent_events(
+        agent, app_name, session_service, user_id, session_id, query
+    ):
+        pass
+
+    session = await session_service.get_session(
+        app_name=app_name, user_id=user_id, session_id=session_id
+    )
+    if session is None:
+        # Callers fall back to their default answer for a missing output_key
+        print(f"{agent.name}: session {session_id} is gone, no state to return")
+        return {}
+    return session.state
+
+
+async def stream_agent(agent, app_name, session_service, user_id, session_id, query):
+    """Like run_agent, but yields response text chunks as the model emits them."""
+    streamed = False
+    async for event in _agent_events(
+        agent,
+        app_name,
+        session_service,
+        user_id,
+        session_id,
+        query,
+        run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+    ):
+        if not event.content or not event.content.parts:
+            continue
+        text = "".join(part.text or "" for part in event.content.parts)
+        if event.partial:
+            streamed = True
+            yield text
+        elif event.is_final_response() and not streamed:
+            # Model without streaming support: send the whole answer at once
+            yield text
+
+
+async def stream_report(agent, sessions, user_id, prediction, query):
+    """
+    Server-Sent Events for a diagnostic report: the model prediction first,
+    then the report text as it is generated, then a final "done" event.
+    """
+    yield {"event": "prediction", "data": json.dumps(prediction)}
+    async with sessions.session(user_id) as session_id:
+        async for text in stream_agent(
+            agent,
+            sessions.app_name,
+            sessions.session_service,
+            user_id,
+            session_id,
+            query,
+        ):
+            yield {"event": "token", "data": text}
+    yield {"event": "done", "data": ""}
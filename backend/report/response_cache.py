@@ -0,0 +1,161 @@
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from preprocessing.metrics import counter
+
+CHATBOT_CACHE_SIZE = int(os.getenv("CHATBOT_CACHE_SIZE", "2048"))
+CHATBOT_CACHE_TTL_SECONDS = float(os.getenv("CHATBOT_CACHE_TTL_SECONDS", "86400"))
+# Optional second tier matching paraphrases by embedding cosine similarity
+SEMANTIC_CACHE = os.getenv("CHATBOT_SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_THRESHOLD = float(os.getenv("CHATBOT_SEMANTIC_THRESHOLD", "0.95"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
+
+
+def normalize(query):
+    """Case, whitespace and trailing punctuation don't change the answer."""
+    return re.sub(r"\s+", " ", query.lower()).strip().strip("?!. ")
+
+
+def prompt_fingerprint(agent):
+    # Entries are keyed on the prompt, so editing chat/agents/*/prompt.py
+    # invalidates that agent's answers
+    return hashlib.sha1(str(agent.instruction).encode()).hexdigest()[:12]
+
+
+async def genai_embed(text):
+    from google import genai
+
+    result = await genai.Client().aio.models.embed_content(
+        model=EMBEDDING_MODEL, contents=text
+    )
+    return result.embeddings[0].values
+
+
+class ResponseCache:
+    """
+    Per-agent cache of LLM answers keyed on the normalized query text.
+
+    Entries expire after `ttl_seconds` and each agent keeps at most `maxsize`
+    entries (least recently used evicted first). With `embed` set, a miss on
+    the exact key falls back to the most similar cached query of the same
+    agent whose cosine similarity is at least `threshold`. Embeddings are
+    memoized by normalized query, so a miss followed by `put` (or the
+    classifier and a specialist seeing the same query) embeds it only once.
+    """
+
+    def __init__(
+        self,
+        maxsize=CHATBOT_CACHE_SIZE,
+        ttl_seconds=CHATBOT_CACHE_TTL_SECONDS,
+        embed=genai_embed if SEMANTIC_CACHE else None,
+        threshold=SEMANTIC_THRESHOLD,
+    ):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.embed = embed
+        self.threshold = threshold
+        self._entries = {}  # agent name -> OrderedDict(key -> (expires, value, vector))
+        self._vectors = OrderedDict()  # normalized query -> unit vector
+
+    def _agent_entries(self, agent):
+        return self._entries.setdefault(agent.name, OrderedDict())
+
+    def _key(self, agent, query):
+        return (prompt_fingerprint(agent), normalize(query))
+
+    def _count(self, agent, kind):
+        counter(
+            "chatbot_cache_lookups",
+            "Response cache lookups by agent and result",
+            {"agent": agent.name, "result": kind},
+        ).inc()
+
+    async def _vector(self, query):
+        """The query's unit embedding, or None when embedding it failed."""
+        text = normalize(query)
+        vector = self._vectors.get(text)
+        if vector is None:
+            try:
+                vector = np.asarray(await self.embed(text), dtype=np.float32)
+            except Exception:
+                # The embedding service is down or over quota: exact matches
+                # still work
+                counter(
+                    "chatbot_cache_embed_errors", "Queries that could not be embedded"
+                ).inc()
+                return None
+            vector = vector / (np.linalg.norm(vector) or 1.0)
+            self._vectors[text] = vector
+            while len(self._vectors) > self.maxsize:
+                self._vectors.popitem(last=False)
+        self._vectors.move_to_end(text)
+        return vector
+
+    def _similar(self, entries, fingerprint, vector):
+        candidates = [
+            (key, value, cached)
+            for key, (_, value, cached) in entries.items()
+            if cached is not None and key[0] == fingerprint
+        ]
+        if not candidates:
+            return None
+        scores = np.stack([cached for _, _, cached in candidates]) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        entries.move_to_end(candidates[best][0])
+        return candidates[best][1]
+
+    def _expire(self, entries):
+        now = time.monotonic()
+        for key in [key for key, (expires, _, _) in entries.items() if expires < now]:
+            del entries[key]
+
+    async def get(self, agent, query):
+        entries = self._agent_entries(agent)
+        self._expire(entries)
+        key = self._key(agent, query)
+
+        if key in entries:
+            entries.move_to_end(key)
+            self._count(agent, "hit")
+            return entries[key][1]
+
+        vector = await self._vector(query) if self.embed is not None else None
+        if vector is not None:
+            value = self._similar(entries, key[0], vector)
+            if value is not None:
+                self._count(agent, "semantic_hit")
+                return value
+
+        self._count(agent, "miss")
+        return None
+
+    async def put(self, agent, query, value):
+        entries = self._agent_entries(agent)
+        # None without embeddings, or when embedding failed: exact match only
+        vector = await self._vector(query) if self.embed is not None else None
+        entries[self._key(agent, query)] = (
+            time.monotonic() + self.ttl_seconds,
+            value,
+            vector,
+        )
+        entries.move_to_end(self._key(agent, query))
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def invalidate(self, agent_name=None):
+        """Drop one agent's answers, or every agent's when no name is given."""
+        if agent_name is None:
+            self._entries.clear()
+            self._vectors.clear()
+        else:
+            self._entries.pop(agent_name, None)
+
+    def stats(self):
+        return {name: len(entries) for name, entries in self._entries.items()}
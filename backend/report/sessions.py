@@ -0,0 +1,134 @@
+import os
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+
+from google.adk.sessions import InMemorySessionService
+
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+
+
+class UnknownSession(KeyError):
+    """A session id that was never issued, or whose session has expired."""
+
+
+class SessionManager:
+    """
+    Issues isolated agent sessions for one app and bounds how many are kept.
+
+    Every request gets its own session id, so concurrent requests never share
+    `session.state`. Sessions idle for longer than `ttl_seconds` are deleted,
+    and when more than `max_sessions` are open the least recently used ones
+    are deleted first. Sessions in use by `session()` are never evicted, so
+    the count can exceed `max_sessions` while that many are in flight.
+    Session ids are only ever minted here, so a client cannot pick (or guess)
+    the id of another client's conversation.
+    """
+
+    def __init__(
+        self,
+        app_name,
+        session_service=None,
+        ttl_seconds=SESSION_TTL_SECONDS,
+        max_sessions=SESSION_MAX_COUNT,
+    ):
+        self.app_name = app_name
+        self.session_service = session_service or InMemorySessionService()
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._last_used = OrderedDict()  # (user_id, session_id) -> monotonic time
+        self._pinned = Counter()  # (user_id, session_id) -> session() users
+
+    def __len__(self):
+        return len(self._last_used)
+
+    def _touch(self, key):
+        self._last_used[key] = time.monotonic()
+        self._last_used.move_to_end(key)
+
+    async def acquire(self, user_id, session_id=None, pin=False):
+        """
+        Create a session and return its id, or touch the existing session
+        `session_id`. Ids this manager did not issue, or has since evicted,
+        raise UnknownSession. With `pin`, the session is also protected from
+        eviction until `unpin`.
+        """
+        await self.evict()
+        if session_id is None:
+            session_id = uuid.uuid4().hex
+            await self._create((user_id, session_id), pin)
+            return session_id
+
+        key = (user_id, session_id)
+        if key not in self._last_used:
+            raise UnknownSession(session_id)
+        self._touch(key)
+        if pin:
+            self._pinned[key] += 1
+        return session_id
+
+    async def _create(self, key, pin):
+        user_id, session_id = key
+        await self.session_service.create_session(
+            app_name=self.app_name, user_id=user_id, session_id=session_id
+        )
+        self._touch(key)
+        if pin:
+            self._pinned[key] += 1
+        await self.evict()
+
+    def unpin(self, user_id, session_id):
+        key = (user_id, session_id)
+        self._pinned[key] -= 1
+        if self._pinned[key] <= 0:
+            del self._pinned[key]
+        if key in self._last_used:
+            self._touch(key)
+
+    async def release(self, user_id, session_id):
+        if self._last_used.pop((user_id, session_id), None) is not None:
+            await self.session_service.delete_session(
+                app_name=self.app_name, user_id=user_id, session_id=session_id
+            )
+
+    async def evict(self):
+        now = time.monotonic()
+        expired = [
+            key
+            for key, last_used in self._last_used.items()
+            if now - last_used > self.ttl_seconds and key not in self._pinned
+        ]
+        overflow = len(self._last_used) - len(expired) - self.max_sessions
+        if overflow > 0:
+            stale = set(expired)
+            idle = [
+                key
+                for key in self._last_used
+                if key not in stale and key not in self._pinned
+            ]
+            expired += idle[:overflow]
+        for user_id, session_id in expired:
+            # May have been picked up while an earlier delete was awaited
+            if (user_id, session_id) not in self._pinned:
+                await self.release(user_id, session_id)
+
+    async def start(self, user_id):
+        """Open a long-lived session for a new conversation and return its id."""
+        return await self.acquire(user_id)
+
+    @asynccontextmanager
+    async def session(self, user_id, conversation_id=None):
+        """
+        One-shot session deleted on exit, or, with `conversation_id` (from
+        `start`), the session of that conversation, kept until TTL/LRU
+        eviction.
+        """
+        session_id = await self.acquire(user_id, conversation_id, pin=True)
+        try:
+            yield session_id
+        finally:
+            self.unpin(user_id, session_id)
+            if conversation_id is None:
+                await self.release(user_id, session_id)
@@ -1,22 +1,54 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+import asyncio
+import importlib
+import io
 import json
+import os
 import uvicorn
 import multiprocessing
+from sse_starlette.sse import EventSourceResponse
+
+from preprocessing.inference import model_name
+from preprocessing.registry import registry
+from preprocessing import metrics
+from preprocessing.tracing import TimingMiddleware, configure_tracing
+from preprocessing.uploads import (
+    UploadSizeLimitMiddleware,
+    UploadTooLarge,
+    read_upload_async,
+)
+from report.jobs import JOB_MAX_WAIT_SECONDS, JobQueue, JobQueueFull
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Start the report job queue and any route warmup; stop them on shutdown."""
+    global warmup_task
+    await job_queue.start()
+    if WARMUP_ROUTES:
+        warmup_task = asyncio.create_task(warmup(WARMUP_ROUTES))
+    try:
+        yield
+    finally:
+        if warmup_task is not None:
+            warmup_task.cancel()
+        await job_queue.stop()
 
-from report.alzhaimer import generate_alzhaimer_report
-from report.brain import generate_brain_report
-from report.chatbot import get_chatbot_response
-from report.heart import generate_heart_report
-from report.kidney import generate_kidney_report
 
 app = FastAPI(
     title="Medical Diagnostic Test App",
     description="Test endpoints for Alzheimer, Brain Tumor, Heart Disease, Kidney Disease, and Chatbot classification",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Oversized uploads are refused before the multipart body is parsed
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # Allow CORS for testing if needed
 app.add_middleware(
     CORSMiddleware,
@@ -24,8 +56,82 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# Outermost, so the request span and Server-Timing total cover everything
+configure_tracing("test_app")
+app.add_middleware(TimingMiddleware)
+
+
+# ----------- Lazy Report Modules -------------
+# Each route imports its report module (TensorFlow, PyTorch, XGBoost,
+# google-adk, ...) on first use, so the server accepts connections at once.
+REPORT_MODULES = {
+    "alzhaimer": "report.alzhaimer",
+    "brain": "report.brain",
+    "heart": "report.heart",
+    "kidney": "report.kidney",
+    "chatbot": "report.chatbot",
+}
+# Registry models each route needs
+ROUTE_MODELS = {
+    "alzhaimer": [model_name("alzhaimer")],
+    "brain": [model_name("brain")],
+    "heart": ["heart", "heart_features"],
+    "kidney": ["kidney"],
+    "chatbot": [],
+}
+# Comma-separated routes to import and load in the background at startup,
+# or "all"; /ready answers 503 until they are done, and stays 503 if any failed
+WARMUP = os.getenv("WARMUP", "")
+if WARMUP == "all":
+    WARMUP_ROUTES = list(REPORT_MODULES)
+else:
+    WARMUP_ROUTES = [name.strip() for name in WARMUP.split(",") if name.strip()]
+
+warmup_task = None
+warmup_failures = {}  # route -> error, for routes whose warmup failed
+# Fully imported report modules (sys.modules also holds half-imported ones)
+loaded_modules = {}
+
+
+def import_report(name):
+    module = importlib.import_module(REPORT_MODULES[name])
+    loaded_modules[name] = module
+    return module
+
+
+async def report_module(name):
+    module = loaded_modules.get(name)
+    if module is None:
+        # The first import can take seconds; keep the event loop serving
+        module = await asyncio.to_thread(import_report, name)
+    return module
+
+
+def warm_route(name):
+    import_report(name)
+    if ROUTE_MODELS[name]:
+        registry.warmup(ROUTE_MODELS[name])
+
+
+async def warmup(names):
+    for name in names:
+        try:
+            await asyncio.to_thread(warm_route, name)
+            print(f"warmed up {name}")
+        except Exception as e:
+            warmup_failures[name] = str(e)
+            print(f"warmup of {name} failed: {e}")
+
+
+async def receive_upload(image_file: UploadFile):
+    try:
+        return await read_upload_async(image_file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
 
 # ----------- Alzheimer Endpoint -------------
 @app.post("/test/alzhaimer")
@@ -37,10 +143,11 @@ async def test_alzhaimer_report(
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid patient_data JSON")
 
-    # ✅ FIXED: read raw bytes from file
-    image_bytes = image_file.file.read()
-
-    res = await generate_alzhaimer_report(image_bytes, parsed_data)
+    upload = await receive_upload(image_file)
+    alzhaimer = await report_module("alzhaimer")
+    res = await alzhaimer.generate_alzhaimer_report(
+        upload.data, parsed_data, upload.digest
+    )
     return res
 
 
@@ -52,7 +159,10 @@ async def test_brain(image: UploadFile = File(...), patient_data: str = Form(...
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid patient_data JSON")
 
-    return await generate_brain_report(image_file=image.file, patient_data=parsed_data)
+    brain = await report_module("brain")
+    return await brain.generate_brain_report(
+        image_file=image.file, patient_data=parsed_data
+    )
 
 
 # ----------- Heart Disease Endpoint -------------
@@ -64,7 +174,8 @@ async def test_heart(formData: str = Form(...), additionalInfo: str = Form(...))
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid form data JSON")
 
-    return await generate_heart_report(
+    heart = await report_module("heart")
+    return await heart.generate_heart_report(
         formData=form_data_dict, additionalInfo=additional_info_dict
     )
 
@@ -78,15 +189,287 @@ async def test_kidney(formData: str = Form(...), additionalInfo: str = Form(...)
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid form data JSON")
 
-    return await generate_kidney_report(
+    kidney = await report_module("kidney")
+    return await kidney.generate_kidney_report(
         formData=form_data_dict, additionalInfo=additional_info_dict
     )
 
 
+# ----------- Streaming Report Endpoints -------------
+# The prediction runs before the response starts (and before the upload is
+# closed); it is sent as the first event, followed by the report tokens.
+@app.post("/test/alzhaimer/stream")
+async def test_alzhaimer_report_stream(
+    image_file: UploadFile = File(...), patient_data: str = Form(...)
+):
+    try:
+        parsed_data = json.loads(patient_data)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid patient_data JSON")
+
+    upload = await receive_upload(image_file)
+    alzhaimer = await report_module("alzhaimer")
+    prediction, query = await alzhaimer.build_alzhaimer_query(
+        upload.data, parsed_data, upload.digest
+    )
+    return EventSourceResponse(alzhaimer.stream_alzhaimer_report(prediction, query))
+
+
+@app.post("/test/brain/stream")
+async def test_brain_stream(
+    image: UploadFile = File(...), patient_data: str = Form(...)
+):
+    try:
+        parsed_data = json.loads(patient_data)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid patient_data JSON")
+
+    brain = await report_module("brain")
+    prediction, query = await brain.build_brain_query(image.file, parsed_data)
+    return EventSourceResponse(brain.stream_brain_report(prediction, query))
+
+
+@app.post("/test/heart/stream")
+async def test_heart_stream(formData: str = Form(...), additionalInfo: str = Form(...)):
+    try:
+        form_data_dict = json.loads(formData)
+        additional_info_dict = json.loads(additionalInfo)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid form data JSON")
+
+    heart = await report_module("heart")
+    prediction, query = heart.build_heart_query(form_data_dict, additional_info_dict)
+    return EventSourceResponse(heart.stream_heart_report(prediction, query))
+
+
+@app.post("/test/kidney/stream")
+async def test_kidney_stream(
+    formData: str = Form(...), additionalInfo: str = Form(...)
+):
+    try:
+        form_data_dict = json.loads(formData)
+        additional_info_dict = json.loads(additionalInfo)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid form data JSON")
+
+    kidney = await report_module("kidney")
+    prediction, query = kidney.build_kidney_query(form_data_dict, additional_info_dict)
+    return EventSourceResponse(kidney.stream_kidney_report(prediction, query))
+
+
+# ----------- Report Jobs -------------
+# POST /jobs/<disease> takes the same form as /test/<disease> but answers 202
+# with a job id at once; the report is generated by a bounded worker pool and
+# fetched with GET /jobs/{job_id}?wait=<seconds> (long-poll).
+async def run_alzhaimer_job(payload):
+    alzhaimer = await report_module("alzhaimer")
+    return await alzhaimer.generate_alzhaimer_report(
+        payload["image"], payload["patient_data"], payload["digest"]
+    )
+
+
+async def run_brain_job(payload):
+    brain = await report_module("brain")
+    return await brain.generate_brain_report(
+        image_file=io.BytesIO(payload["image"]), patient_data=payload["patient_data"]
+    )
+
+
+async def run_heart_job(payload):
+    heart = await report_module("heart")
+    return await heart.generate_heart_report(
+        formData=payload["formData"], additionalInfo=payload["additionalInfo"]
+    )
+
+
+async def run_kidney_job(payload):
+    kidney = await report_module("kidney")
+    return await kidney.generate_kidney_report(
+        formData=payload["formData"], additionalInfo=payload["additionalInfo"]
+    )
+
+
+job_queue = JobQueue(
+    {
+        "alzhaimer": run_alzhaimer_job,
+        "brain": run_brain_job,
+        "heart": run_heart_job,
+        "kidney": run_kidney_job,
+    }
+)
+
+
+async def submit_job(kind, payload, size=0):
+    try:
+        job_id = await job_queue.submit(kind, payload, size)
+    except JobQueueFull as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": "5"}
+        )
+    return JSONResponse(
+        {"job_id": job_id, "status": "queued"},
+        status_code=202,
+        headers={"Location": f"/jobs/{job_id}"},
+    )
+
+
+@app.post("/jobs/alzhaimer")
+async def submit_alzhaimer_job(
+    image_file: UploadFile = File(...), patient_data: str = Form(...)
+):
+    try:
+        parsed_data = json.loads(patient_data)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid patient_data JSON")
+
+    upload = await receive_upload(image_file)
+    return await submit_job(
+        "alzhaimer",
+        {"image": upload.data, "digest": upload.digest, "patient_data": parsed_data},
+        upload.size,
+    )
+
+
+@app.post("/jobs/brain")
+async def submit_brain_job(
+    image: UploadFile = File(...), patient_data: str = Form(...)
+):
+    try:
+        parsed_data = json.loads(patient_data)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid patient_data JSON")
+
+    upload = await receive_upload(image)
+    payload = {"image": upload.data, "patient_data": parsed_data}
+    return await submit_job("brain", payload, upload.size)
+
+
+@app.post("/jobs/heart")
+async def submit_heart_job(
+    formData: str = Form(...), additionalInfo: str = Form(...)
+):
+    try:
+        form_data_dict = json.loads(formData)
+        additional_info_dict = json.loads(additionalInfo)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid form data JSON")
+
+    return await submit_job(
+        "heart", {"formData": form_data_dict, "additionalInfo": additional_info_dict}
+    )
+
+
+@app.post("/jobs/kidney")
+async def submit_kidney_job(
+    formData: str = Form(...), additionalInfo: str = Form(...)
+):
+    try:
+        form_data_dict = json.loads(formData)
+        additional_info_dict = json.loads(additionalInfo)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid form data JSON")
+
+    return await submit_job(
+        "kidney", {"formData": form_data_dict, "additionalInfo": additional_info_dict}
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str, wait: float = Query(0.0, ge=0, le=JOB_MAX_WAIT_SECONDS)
+):
+    """The job's status and result; with `wait`, held open until it finishes."""
+    job = await job_queue.wait(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 # ----------- General Chatbot Classifier -------------
 @app.post("/test/chatbot")
-async def test_chatbot(query: str):
-    return await get_chatbot_response(query)
+async def test_chatbot(
+    query: str, conversation_id: Optional[str] = None, conversation: bool = False
+):
+    """
+    A one-shot answer, or with `conversation` a first turn that opens a
+    conversation. Later turns send back the `conversation_id` it returned.
+    """
+    chatbot = await report_module("chatbot")
+    if conversation_id is None and conversation:
+        conversation_id = await chatbot.start_conversation()
+    try:
+        response = await chatbot.get_chatbot_response(query, conversation_id)
+    except chatbot.UnknownSession:
+        raise HTTPException(status_code=404, detail="Unknown or expired conversation")
+    return {"response": response, "conversation_id": conversation_id}
+
+
+@app.post("/test/chatbot/cache/invalidate")
+async def invalidate_chatbot_cache(agent: Optional[str] = None):
+    # Nothing is cached until the chatbot module has been loaded
+    chatbot = loaded_modules.get("chatbot")
+    if chatbot is None:
+        return {"invalidated": agent or "all", "entries": {}}
+    chatbot.response_cache.invalidate(agent)
+    return {"invalidated": agent or "all", "entries": chatbot.response_cache.stats()}
+
+
+# ----------- Readiness -------------
+@app.get("/ready")
+async def readiness():
+    """
+    Which routes and models are loaded; 503 while startup warmup runs, and
+    after it if a route failed to warm up.
+    """
+    warming = warmup_task is not None and not warmup_task.done()
+    ready = not warming and not warmup_failures
+    status = {
+        "ready": ready,
+        "warmup": WARMUP_ROUTES,
+        "failed": warmup_failures,
+        "routes": {
+            name: {
+                "imported": name in loaded_modules,
+                "models": {
+                    model: registry.is_warm(model)
+                    for model in ROUTE_MODELS[name]
+                    if model in registry
+                },
+            }
+            for name in REPORT_MODULES
+        },
+    }
+    return JSONResponse(status, status_code=200 if ready else 503)
+
+
+# ----------- Model Registry -------------
+@app.get("/models")
+async def models_status():
+    return registry.status()
+
+
+@app.post("/models/reload")
+def models_reload(name: Optional[str] = None):
+    if name is None:
+        return {"reloaded": registry.reload_changed()}
+    try:
+        registry.reload(name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"reloaded": [name]}
+
+
+# ----------- Metrics -------------
+@app.get("/metrics")
+async def metrics_snapshot():
+    return metrics.snapshot()
+
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def metrics_prometheus():
+    return PlainTextResponse(
+        metrics.prometheus_text(), media_type="text/plain; version=0.0.4"
+    )
 
 
 # ----------- Run the app -------------
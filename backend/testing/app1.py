@@ -9,7 +9,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".
 
 import matplotlib.pyplot as plt
 import numpy as np
-from backend.preprocessing.alzhaimer import load_model, predict
+from backend.preprocessing.alzhaimer import DEVICE, get_model, predict
 
 
 st.set_page_config(page_title="Dementia MRI Classifier", layout="centered")
@@ -19,9 +19,9 @@ st.write("Upload a grayscale `.jpg` brain MRI (128x128) to predict the dementia
 uploaded_file = st.file_uploader("Choose an MRI image", type=["jpg", "jpeg", "png"])
 
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model_path = "backend/models/dementia_classifier.pth"
-model = load_model(model_path, device)
+# Loaded once per process, not on every Streamlit rerun
+device = DEVICE
+model = get_model()
 
 if uploaded_file is not None:
     st.image(uploaded_file, caption="Uploaded MRI", use_column_width=True)
@@ -6,7 +6,7 @@ import matplotlib.pyplot as plt
 # Add project root to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
 
-from backend.preprocessing.brain import load_model, predict
+from backend.preprocessing.brain import get_model, predict
 
 # Page config
 st.set_page_config(page_title="🧠 Brain Tumor Classifier", layout="centered")
@@ -16,8 +16,8 @@ st.write("Upload a brain MRI image (150x150 RGB) to predict the tumor type.")
 
 uploaded_file = st.file_uploader("Choose a brain MRI", type=["jpg", "jpeg", "png"])
 
-model_path = "backend/models/brain.h5"
-model = load_model(model_path)
+# Loaded once per process, not on every Streamlit rerun
+model = get_model()
 
 if uploaded_file is not None:
     st.image(uploaded_file, caption="Uploaded MRI", use_column_width=True)
@@ -84,7 +84,7 @@ if submitted:
     }
 
     X_input = preprocess_input(user_input)
-    model = load_model()
+    model = load_model(model_name)
     # Predict and get probabilities if available
     if hasattr(model, "predict_proba"):
         proba = model.predict_proba(X_input)[0]